@@ -0,0 +1,71 @@
+from fastapi import APIRouter
+from app.tmdb.cache import response_cache
+from app.tmdb.singleflight import tmdb_flights
+from app.tmdb.fetch import refresh_stats, get_revalidation_stats
+from app.tmdb.aggregate import movie_aggregates
+from app.tmdb.summary import movie_summaries
+from app.tmdb.projection import tmdb_projections
+from app.tmdb.governor import tmdb_governor
+from app.tmdb.breaker import tmdb_breaker
+from app.deadline import budget_stats
+from app.database import pool_stats
+from app.auth.principal import principal_cache
+from app.auth.passwords import password_hasher
+from app.http_cache import compressed_cache, compression_stats
+from app.history_buffer import history_buffer
+from app.progress import progress_tracker
+from app.api.playback import playback_stats
+
+# Create router
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/tmdb")
+def get_tmdb_metrics():
+    """Get TMDB proxy cache, coalescing, refresh and upstream health statistics"""
+    return {
+        "cache": response_cache.stats(),
+        "singleflight": tmdb_flights.stats(),
+        "background_refresh": dict(refresh_stats),
+        "revalidation": get_revalidation_stats(),
+        "movie_aggregates": movie_aggregates.stats(),
+        "movie_summaries": movie_summaries.cache.stats(),
+        "projections": tmdb_projections.stats(),
+        "governor": tmdb_governor.stats(),
+        "circuit_breaker": tmdb_breaker.stats()
+    }
+
+
+@metrics_router.get("/deadlines")
+def get_deadline_metrics():
+    """Get requests, latency budget overruns and timeouts per route"""
+    return budget_stats.stats()
+
+
+@metrics_router.get("/http")
+def get_http_metrics():
+    """Get conditional GET and response compression statistics"""
+    return {
+        **compression_stats,
+        "compressed_cache": compressed_cache.stats()
+    }
+
+
+@metrics_router.get("/auth")
+def get_auth_metrics():
+    """Get authenticated user cache and password hashing statistics"""
+    return {
+        "principal_cache": principal_cache.stats(),
+        "password_hashing": password_hasher.stats()
+    }
+
+
+@metrics_router.get("/db")
+async def get_db_metrics():
+    """Get database connection pool usage, checkout wait times and buffered writes"""
+    return {
+        **pool_stats(),
+        "history_buffer": history_buffer.stats(),
+        "progress": progress_tracker.stats(),
+        "playback_sockets": dict(playback_stats)
+    }
@@ -1,20 +1,59 @@
 from fastapi import APIRouter, HTTPException
-import requests
-from app.config import TMDB_BASE_URL, TMDB_HEADERS, TMDB_ACCESS_TOKEN
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel, Field
+from typing import List, Optional
+import asyncio
+import httpx
+import orjson
+from app.config import TMDB_BASE_URL, TMDB_ACCESS_TOKEN, TMDB_BATCH_MAX_IDS
+from app.tmdb.cache import make_cache_key
+from app.tmdb.fetch import fetch_raw
+from app.tmdb.projection import InvalidFieldSpec, Projection, compile_projection, tmdb_projections
+from app.tmdb.aggregate import movie_aggregates
+from app.tmdb.genres import genre_index
 
 # Create router
 movies_router = APIRouter()
 
 
+def raw_json_response(body: bytes) -> Response:
+    """Return a JSON body as-is, without decoding and re-encoding it"""
+    return Response(content=body, media_type="application/json")
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Projection]:
+    """Compile a ?fields= value, None when the full payload is wanted"""
+    if fields is None:
+        return None
+    try:
+        return compile_projection(fields)
+    except InvalidFieldSpec as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def projected_json_response(key: str, body: bytes, projection: Optional[Projection]) -> Response:
+    """Return a cached TMDB body, trimmed to the requested fields if any"""
+    if projection is None:
+        return raw_json_response(body)
+    return raw_json_response(tmdb_projections.project(key, body, projection))
+
+
+def projected_orjson_response(content: dict, projection: Optional[Projection]) -> ORJSONResponse:
+    """Return an already decoded payload, trimmed to the requested fields if any"""
+    if projection is None:
+        return ORJSONResponse(content)
+    return ORJSONResponse(projection.apply(content))
+
+
 @movies_router.get("/search")
-def search_movies(query: str, page: int = 1, include_adult: bool = False, language: str = "en-US", with_genres: str = None, year: str = None, sort_by: str = None):
+async def search_movies(query: str, page: int = 1, include_adult: bool = False, language: str = "en-US", with_genres: str = None, year: str = None, sort_by: str = None):
     """Search for movies using TMDB API"""
     try:
         # Log the incoming request parameters
         print(f"[TMDB API] Received search request with query: {query}")
 
         # Make sure we're using the correct endpoint and passing all parameters
-        url = f"{TMDB_BASE_URL}/search/movie"
+        path = "/search/movie"
 
         # Create params dictionary with required parameters
         params = {
@@ -33,27 +72,15 @@ def search_movies(query: str, page: int = 1, include_adult: bool = False, langua
             params["sort_by"] = sort_by
 
         # Log the request for debugging
-        print(f"[TMDB API] Request URL: {url}")
+        print(f"[TMDB API] Request URL: {TMDB_BASE_URL}{path}")
         print(f"[TMDB API] Request params: {params}")
-        print(f"[TMDB API] Request headers: {TMDB_HEADERS}")
-
-        # Make the request to TMDB API
-        response = requests.get(
-            url,
-            headers=TMDB_HEADERS,
-            params=params
-        )
-
-        # Log the response status
-        print(f"[TMDB API] Response status: {response.status_code}")
-
-        if response.status_code != 200:
-            print(f"[TMDB API] Error response: {response.text}")
 
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        # Make the request to TMDB API (or serve it from cache)
+        return raw_json_response(await fetch_raw(path, params=params))
+    except httpx.HTTPError as e:
         print(f"[TMDB API] Exception: {str(e)}")
+        if isinstance(e, httpx.HTTPStatusError):
+            print(f"[TMDB API] Error response: {e.response.text}")
         raise HTTPException(
             status_code=500,
             detail=f"Error searching movies: {str(e)}"
@@ -61,7 +88,7 @@ def search_movies(query: str, page: int = 1, include_adult: bool = False, langua
 
 
 @movies_router.get("/{category}")
-def get_movies_by_category(category: str, page: int = 1, with_genres: str = None, year: str = None, sort_by: str = None):
+async def get_movies_by_category(category: str, page: int = 1, with_genres: str = None, year: str = None, sort_by: str = None):
     try:
         params = {
             "language": "en-US",
@@ -75,42 +102,21 @@ def get_movies_by_category(category: str, page: int = 1, with_genres: str = None
         if sort_by:
             params["sort_by"] = sort_by
 
-        response = requests.get(
-            f"{TMDB_BASE_URL}/movie/{category}",
-            headers=TMDB_HEADERS,
-            params=params
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        return raw_json_response(await fetch_raw(f"/movie/{category}", params=params))
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=500, detail=f"Error fetching movies: {str(e)}")
 
 
 @movies_router.get("/movie/{movie_id}")
-def get_movie_details(movie_id: int):
+async def get_movie_details(movie_id: int, fields: Optional[str] = None):
+    projection = parse_fields(fields)
     try:
-        params = {
-            "language": "en-US",
-            "append_to_response": "videos,credits,similar"
-        }
-
-        response = requests.get(
-            f"{TMDB_BASE_URL}/movie/{movie_id}",
-            headers=TMDB_HEADERS,
-            params=params
-        )
-
-        if response.status_code == 404:
-            raise HTTPException(
-                status_code=404,
-                detail="Movie not found"
-            )
-
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        if isinstance(e, requests.exceptions.HTTPError) and e.response.status_code == 404:
+        # Details with appended videos, credits and similar movies
+        body = await movie_aggregates.get_raw(movie_id)
+        return projected_json_response(movie_aggregates.key(movie_id), body, projection)
+    except httpx.HTTPError as e:
+        if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 404:
             raise HTTPException(
                 status_code=404,
                 detail=f"Movie with ID {movie_id} not found"
@@ -121,8 +127,47 @@ def get_movie_details(movie_id: int):
         )
 
 
+class MovieBatchRequest(BaseModel):
+    ids: List[int] = Field(..., max_length=TMDB_BATCH_MAX_IDS)
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "ids": [550, 680, 13]
+            }
+        }
+
+
+def _batch_item_error(movie_id: int, error: BaseException) -> dict:
+    """Describe why a single movie in a batch could not be fetched"""
+    if isinstance(error, HTTPException):
+        return {"id": movie_id, "status": error.status_code, "error": error.detail}
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 404:
+        return {"id": movie_id, "status": 404, "error": f"Movie with ID {movie_id} not found"}
+    if isinstance(error, asyncio.TimeoutError):
+        return {"id": movie_id, "status": 504, "error": "Timed out fetching movie details"}
+    return {"id": movie_id, "status": 502, "error": f"Error fetching movie details: {str(error)}"}
+
+
+@movies_router.post("/movies/batch")
+async def get_movies_batch(batch: MovieBatchRequest):
+    """Get details for many movies at once, in the order requested"""
+    results = await movie_aggregates.get_many(batch.ids)
+
+    # Splice the cached TMDB bodies into the response instead of decoding them
+    items = []
+    for movie_id in batch.ids:
+        body, error = results[movie_id]
+        if error is not None:
+            items.append(orjson.dumps(_batch_item_error(movie_id, error)))
+        else:
+            items.append(b'{"id":%d,"status":200,"data":%b}' % (movie_id, body))
+    return raw_json_response(b'{"results":[' + b",".join(items) + b"]}")
+
+
 @movies_router.get("/movie/{movie_id}/images")
-def get_movie_images(movie_id: int):
+async def get_movie_images(movie_id: int, fields: Optional[str] = None):
+    projection = parse_fields(fields)
     try:
         # Log the request
         print(f"[TMDB API] Fetching images for movie ID: {movie_id}")
@@ -138,33 +183,19 @@ def get_movie_images(movie_id: int):
             "language": "en"
         }
 
-        # Make the request to TMDB API
-        url = f"{TMDB_BASE_URL}/movie/{movie_id}/images"
-        print(f"[TMDB API] Request URL: {url}")
-        print(f"[TMDB API] Request headers: {headers}")
+        # Make the request to TMDB API (or serve it from cache)
+        path = f"/movie/{movie_id}/images"
+        print(f"[TMDB API] Request URL: {TMDB_BASE_URL}{path}")
         print(f"[TMDB API] Request params: {params}")
 
-        response = requests.get(
-            url,
-            headers=headers,
-            params=params
-        )
-
-        # Log the response status
-        print(f"[TMDB API] Response status: {response.status_code}")
+        body = await fetch_raw(path, params=params, headers=headers)
+        return projected_json_response(make_cache_key(path, params), body, projection)
 
-        # Log the response data
-        if response.status_code == 200:
-            data = response.json()
-            print(f"[TMDB API] Response data: {data}")
-            return data
-        else:
-            print(f"[TMDB API] Error response: {response.text}")
-            response.raise_for_status()
-
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"[TMDB API] Exception: {str(e)}")
-        if isinstance(e, requests.exceptions.HTTPError) and e.response.status_code == 404:
+        if isinstance(e, httpx.HTTPStatusError):
+            print(f"[TMDB API] Error response: {e.response.text}")
+        if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 404:
             raise HTTPException(
                 status_code=404,
                 detail=f"Images for movie with ID {movie_id} not found"
@@ -176,16 +207,11 @@ def get_movie_images(movie_id: int):
 
 
 @movies_router.get("/movie/{movie_id}/watch/providers")
-def get_movie_watch_providers(movie_id: int):
+async def get_movie_watch_providers(movie_id: int):
     """Get streaming availability for a movie"""
     try:
-        response = requests.get(
-            f"{TMDB_BASE_URL}/movie/{movie_id}/watch/providers",
-            headers=TMDB_HEADERS
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        return raw_json_response(await fetch_raw(f"/movie/{movie_id}/watch/providers"))
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching watch providers: {str(e)}"
@@ -193,7 +219,7 @@ def get_movie_watch_providers(movie_id: int):
 
 
 @movies_router.get("/discover/streaming/{provider_id}")
-def get_movies_by_provider(
+async def get_movies_by_provider(
     provider_id: int,
     page: int = 1,
     region: str = "US"
@@ -208,14 +234,8 @@ def get_movies_by_provider(
             "watch_monetization_types": "flatrate"
         }
 
-        response = requests.get(
-            f"{TMDB_BASE_URL}/discover/movie",
-            headers=TMDB_HEADERS,
-            params=params
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        return raw_json_response(await fetch_raw("/discover/movie", params=params))
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching streaming movies: {str(e)}"
@@ -223,17 +243,12 @@ def get_movies_by_provider(
 
 
 @movies_router.get("/watch/providers")
-def get_watch_providers(region: str = "US"):
+async def get_watch_providers(region: str = "US"):
     """Get list of available streaming providers"""
     try:
-        response = requests.get(
-            f"{TMDB_BASE_URL}/watch/providers/movie",
-            headers=TMDB_HEADERS,
-            params={"watch_region": region}
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        return raw_json_response(await fetch_raw(
+            "/watch/providers/movie", params={"watch_region": region}))
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching providers: {str(e)}"
@@ -241,16 +256,17 @@ def get_watch_providers(region: str = "US"):
 
 
 @movies_router.get("/movie/{movie_id}/credits")
-def get_movie_credits(movie_id: int):
+async def get_movie_credits(movie_id: int, fields: Optional[str] = None):
     """Get credits (cast & crew) for a movie"""
+    projection = parse_fields(fields)
     try:
-        response = requests.get(
-            f"{TMDB_BASE_URL}/movie/{movie_id}/credits",
-            headers=TMDB_HEADERS
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        # Slice the cached details payload, call TMDB only if it is missing
+        credits = movie_aggregates.credits(movie_id)
+        if credits is not None:
+            return projected_orjson_response(credits, projection)
+        path = f"/movie/{movie_id}/credits"
+        return projected_json_response(make_cache_key(path), await fetch_raw(path), projection)
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching movie credits: {str(e)}"
@@ -258,16 +274,17 @@ def get_movie_credits(movie_id: int):
 
 
 @movies_router.get("/movie/{movie_id}/videos")
-def get_movie_videos(movie_id: int):
+async def get_movie_videos(movie_id: int, fields: Optional[str] = None):
     """Get videos (trailers, teasers, etc.) for a movie"""
+    projection = parse_fields(fields)
     try:
-        response = requests.get(
-            f"{TMDB_BASE_URL}/movie/{movie_id}/videos",
-            headers=TMDB_HEADERS
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        # Slice the cached details payload, call TMDB only if it is missing
+        videos = movie_aggregates.videos(movie_id)
+        if videos is not None:
+            return projected_orjson_response(videos, projection)
+        path = f"/movie/{movie_id}/videos"
+        return projected_json_response(make_cache_key(path), await fetch_raw(path), projection)
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching movie videos: {str(e)}"
@@ -275,16 +292,17 @@ def get_movie_videos(movie_id: int):
 
 
 @movies_router.get("/movie/{movie_id}/similar")
-def get_similar_movies(movie_id: int):
+async def get_similar_movies(movie_id: int, fields: Optional[str] = None):
     """Get similar movies recommendations"""
+    projection = parse_fields(fields)
     try:
-        response = requests.get(
-            f"{TMDB_BASE_URL}/movie/{movie_id}/similar",
-            headers=TMDB_HEADERS
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        # Slice the cached details payload, call TMDB only if it is missing
+        similar = movie_aggregates.similar(movie_id)
+        if similar is not None:
+            return projected_orjson_response(similar, projection)
+        path = f"/movie/{movie_id}/similar"
+        return projected_json_response(make_cache_key(path), await fetch_raw(path), projection)
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching similar movies: {str(e)}"
@@ -292,21 +310,13 @@ def get_similar_movies(movie_id: int):
 
 
 @movies_router.get("/genres/movie")
-def get_movie_genres():
+async def get_movie_genres(language: str = "en-US"):
     """Get list of movie genres"""
     try:
-        params = {
-            "language": "en-US"
-        }
-
-        response = requests.get(
-            f"{TMDB_BASE_URL}/genre/movie/list",
-            headers=TMDB_HEADERS,
-            params=params
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        # Served from the in-memory genre index
+        await genre_index.ensure_loaded(language)
+        return raw_json_response(genre_index.genres_body(language))
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching genres: {str(e)}"
@@ -314,7 +324,7 @@ def get_movie_genres():
 
 
 @movies_router.get("/discover/genre/{genre_id}")
-def get_movies_by_genre(genre_id: int, page: int = 1):
+async def get_movies_by_genre(genre_id: int, page: int = 1):
     """Get movies by genre"""
     try:
         params = {
@@ -324,14 +334,8 @@ def get_movies_by_genre(genre_id: int, page: int = 1):
             "sort_by": "popularity.desc"
         }
 
-        response = requests.get(
-            f"{TMDB_BASE_URL}/discover/movie",
-            headers=TMDB_HEADERS,
-            params=params
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        return raw_json_response(await fetch_raw("/discover/movie", params=params))
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching movies by genre: {str(e)}"
@@ -339,7 +343,7 @@ def get_movies_by_genre(genre_id: int, page: int = 1):
 
 
 @movies_router.get("/now_playing")
-def get_now_playing(page: int = 1):
+async def get_now_playing(page: int = 1):
     """Get movies now playing in theaters"""
     try:
         params = {
@@ -347,14 +351,8 @@ def get_now_playing(page: int = 1):
             "page": page
         }
 
-        response = requests.get(
-            f"{TMDB_BASE_URL}/movie/now_playing",
-            headers=TMDB_HEADERS,
-            params=params
-        )
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        return raw_json_response(await fetch_raw("/movie/now_playing", params=params))
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching now playing movies: {str(e)}"
@@ -362,26 +360,13 @@ def get_now_playing(page: int = 1):
 
 
 @movies_router.get("/genres/mapping")
-def get_genre_mapping():
+async def get_genre_mapping(language: str = "en-US"):
     """Get mapping of genre names to IDs"""
     try:
-        params = {
-            "language": "en-US"
-        }
-
-        response = requests.get(
-            f"{TMDB_BASE_URL}/genre/movie/list",
-            headers=TMDB_HEADERS,
-            params=params
-        )
-        response.raise_for_status()
-        genres = response.json().get('genres', [])
-
-        # Create a mapping of genre names to IDs
-        genre_mapping = {genre['name'].lower(): genre['id']
-                         for genre in genres}
-        return genre_mapping
-    except requests.RequestException as e:
+        # Served from the in-memory genre index
+        await genre_index.ensure_loaded(language)
+        return raw_json_response(genre_index.name_to_id_body(language))
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching genre mapping: {str(e)}"
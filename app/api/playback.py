@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from jose import jwt
+from pydantic import BaseModel, Field, ValidationError
+
+from app.auth.auth import authenticate_token
+from app.config import PLAYBACK_AUTH_TIMEOUT
+from app.database import AsyncSessionLocal
+from app.progress import progress_tracker
+
+logger = logging.getLogger("corsair_stream.history")
+
+# Not behind create_authenticated_router, the socket authenticates itself on connect
+playback_router = APIRouter()
+
+playback_stats = {
+    "connections": 0,
+    "open": 0,
+    "rejected": 0,
+    "messages": 0,
+    "invalid_messages": 0
+}
+
+
+class PlaybackMessage(BaseModel):
+    # Short keys keep messages small, e.g. {"c": "550", "p": 1260, "d": 8340}
+    content_id: str = Field(..., alias="c", max_length=50)
+    position: Optional[int] = Field(None, alias="p", ge=0)
+    duration: Optional[int] = Field(None, alias="d", gt=0)
+    # {"c": "550", "done": true} marks the title as completed
+    done: bool = False
+
+
+class PlaybackAuth(BaseModel):
+    # First message of a socket without an Authorization header, kept out of
+    # the URL so the token doesn't end up in access logs
+    token: str
+
+
+def _header_token(websocket: WebSocket) -> Optional[str]:
+    scheme, _, credentials = websocket.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and credentials:
+        return credentials
+    return None
+
+
+async def _receive_token(websocket: WebSocket) -> Optional[str]:
+    # Browsers cannot set headers on a WebSocket, they send {"token": "..."} first
+    try:
+        text = await asyncio.wait_for(websocket.receive_text(), PLAYBACK_AUTH_TIMEOUT)
+        return PlaybackAuth.model_validate_json(text).token
+    except (asyncio.TimeoutError, ValidationError):
+        return None
+
+
+async def _close_unsupported(websocket: WebSocket):
+    # receive_text() raises KeyError when the frame is binary
+    await websocket.close(
+        code=status.WS_1003_UNSUPPORTED_DATA, reason="Only text messages are supported")
+
+
+async def _authenticate(token: Optional[str]):
+    if not token:
+        return None
+    async with AsyncSessionLocal() as db:
+        return await authenticate_token(db, token)
+
+
+async def _handle_message(user_id: int, message: PlaybackMessage):
+    # A session only takes a pooled connection if the message is stored
+    async with AsyncSessionLocal() as db:
+        if message.position is not None:
+            await progress_tracker.record(
+                db, user_id, message.content_id, message.position, message.duration)
+        if message.done:
+            # Through the tracker, so its next save keeps the completion
+            await progress_tracker.save_completed(
+                db, user_id, message.content_id, True)
+
+
+@playback_router.websocket("/ws")
+async def playback_socket(websocket: WebSocket):
+    """Stream playback progress over one authenticated connection
+
+    The access token is checked once, from the Authorization header before
+    the socket is accepted, or else from a first `{"token": "..."}` message
+    that must arrive within PLAYBACK_AUTH_TIMEOUT seconds. Each text message
+    then carries one heartbeat, see PlaybackMessage, and goes through the
+    same path as POST /api/history/{content_id}/progress. Only failures get
+    a reply. The socket is closed once the token expires, or with 1003 on a
+    binary frame.
+    """
+    token = _header_token(websocket)
+    if token:
+        principal = await _authenticate(token)
+        if principal is None:
+            playback_stats["rejected"] += 1
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        await websocket.accept()
+    else:
+        await websocket.accept()
+        try:
+            token = await _receive_token(websocket)
+        except WebSocketDisconnect:
+            playback_stats["rejected"] += 1
+            return
+        except KeyError:
+            playback_stats["rejected"] += 1
+            await _close_unsupported(websocket)
+            return
+        principal = await _authenticate(token)
+        if principal is None:
+            playback_stats["rejected"] += 1
+            await websocket.close(
+                code=status.WS_1008_POLICY_VIOLATION, reason="Authentication failed")
+            return
+    expires_at = jwt.get_unverified_claims(token).get("exp")
+
+    playback_stats["connections"] += 1
+    playback_stats["open"] += 1
+    try:
+        while True:
+            try:
+                text = await websocket.receive_text()
+            except KeyError:
+                await _close_unsupported(websocket)
+                return
+            if expires_at is not None and time.time() >= expires_at:
+                await websocket.close(
+                    code=status.WS_1008_POLICY_VIOLATION, reason="Token expired")
+                return
+            playback_stats["messages"] += 1
+            try:
+                message = PlaybackMessage.model_validate_json(text)
+            except ValidationError as e:
+                playback_stats["invalid_messages"] += 1
+                await websocket.send_json({"error": "Invalid message", "detail": e.errors(include_url=False)})
+                continue
+            try:
+                await _handle_message(principal.id, message)
+            except HTTPException as e:
+                # e.g. the write-behind buffer is full, the client may resend
+                await websocket.send_json({"error": e.detail, "c": message.content_id})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        playback_stats["open"] -= 1
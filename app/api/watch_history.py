@@ -1,27 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Path
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.history_buffer import history_buffer
+from app.progress import progress_tracker
 from app.models import WatchHistory
 from app.auth.utils import check_watch_history_owner, create_authenticated_router
 from app.auth.auth import get_current_user
-from pydantic import BaseModel
-from typing import List, Optional
+from app.tmdb.summary import MovieSummary, movie_summaries
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
 from datetime import datetime
 
 # Create router with authentication dependency
 history_router = create_authenticated_router("Watch History")
 
+HISTORY_COLUMNS = ("user_id", "content_id", "watched_at",
+                   "position", "duration", "completed")
+
 
 class WatchHistoryCreate(BaseModel):
-    content_id: str
+    content_id: str = Field(..., max_length=50)
     completed: bool = False
 
 
+class WatchProgress(BaseModel):
+    # Playback position and length of the title, in seconds
+    position: int = Field(..., ge=0)
+    duration: Optional[int] = Field(None, gt=0)
+
+
 class WatchHistoryResponse(BaseModel):
     user_id: int
     content_id: str
     watched_at: str
+    position: Optional[int] = None
+    duration: Optional[int] = None
     completed: bool
+    # Only set with ?expand=movie
+    movie: Optional[MovieSummary] = None
 
     class Config:
         from_attributes = True
@@ -30,136 +47,144 @@ class WatchHistoryResponse(BaseModel):
         }
 
 
+def history_values(history: WatchHistory) -> dict:
+    """Column values of a stored watch history entry"""
+    return {column: getattr(history, column) for column in HISTORY_COLUMNS}
+
+
+def history_response(values: dict) -> dict:
+    """Convert watch history values to a response dict with the watched_at field as a string"""
+    response_dict = {column: values.get(column) for column in HISTORY_COLUMNS}
+    if response_dict["watched_at"] is not None:
+        response_dict["watched_at"] = response_dict["watched_at"].isoformat()
+    response_dict["completed"] = bool(response_dict["completed"])
+    return response_dict
+
+
+def unsaved_history(user_id: int) -> Dict[str, dict]:
+    """Columns written for a user that are not stored yet, by content id"""
+    unsaved = history_buffer.for_user(user_id)
+    for content_id, values in progress_tracker.for_user(user_id).items():
+        unsaved[content_id] = {**unsaved.get(content_id, {}), **values}
+    return unsaved
+
+
 @history_router.post("/", response_model=WatchHistoryResponse)
-def create_watch_history(
+async def create_watch_history(
     history: WatchHistoryCreate,
     current_user=Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Create a new watch history entry"""
-    print(f"Creating watch history for user {
-          current_user.id} with content_id {history.content_id}")
-
-    # Check if the entry already exists
-    existing_history = db.query(WatchHistory).filter(
-        WatchHistory.user_id == current_user.id,
-        WatchHistory.content_id == history.content_id
-    ).first()
-
-    if existing_history:
-        # If it exists, update the watched_at timestamp and completed status
-        print(f"Updating existing watch history: {existing_history}")
-        existing_history.watched_at = datetime.utcnow()
-        existing_history.completed = history.completed
-        db.commit()
-        db.refresh(existing_history)
-
-        # Convert the response to a dictionary with the watched_at field as a string
-        response_dict = {
-            "user_id": existing_history.user_id,
-            "content_id": existing_history.content_id,
-            "watched_at": existing_history.watched_at.isoformat() if existing_history.watched_at else None,
-            "completed": existing_history.completed
-        }
-        return response_dict
-
-    # If it doesn't exist, create a new entry
-    db_history = WatchHistory(
-        user_id=current_user.id,
-        content_id=history.content_id,
-        completed=history.completed
-    )
-    db.add(db_history)
-    db.commit()
-    db.refresh(db_history)
-    print(f"Created watch history: {db_history}")
-
-    # Convert the response to a dictionary with the watched_at field as a string
-    response_dict = {
-        "user_id": db_history.user_id,
-        "content_id": db_history.content_id,
-        "watched_at": db_history.watched_at.isoformat() if db_history.watched_at else None,
-        "completed": db_history.completed
-    }
-    return response_dict
+    """Create or update a watch history entry"""
+    # One round trip: insert, or refresh watched_at and completed on the
+    # existing (user_id, content_id) row. Buffered with write-behind on.
+    values = await progress_tracker.save_completed(
+        db, current_user.id, history.content_id, history.completed)
+
+    # Built from the values just written, without reading the row back
+    return history_response(values)
+
+
+@history_router.post("/{content_id}/progress", response_model=WatchHistoryResponse)
+async def record_watch_progress(
+    progress: WatchProgress,
+    content_id: str = Path(..., max_length=50),
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Record a playback heartbeat, sent about every 10 seconds while playing
+
+    Heartbeats are kept in memory and only some are stored, see
+    ProgressTracker. The entry is marked completed once the position passes
+    PROGRESS_COMPLETION_THRESHOLD of the duration.
+    """
+    values = await progress_tracker.record(
+        db, current_user.id, content_id, progress.position, progress.duration)
+    return history_response(values)
 
 
 @history_router.get("/", response_model=List[WatchHistoryResponse])
-def get_user_history(
+async def get_user_history(
+    expand: Optional[str] = None,
     current_user=Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all watch history for the current user"""
-    histories = db.query(WatchHistory).filter(
-        WatchHistory.user_id == current_user.id).all()
-
-    # Convert the response to a list of dictionaries with the watched_at field as a string
-    response_list = [
-        {
-            "user_id": history.user_id,
-            "content_id": history.content_id,
-            "watched_at": history.watched_at.isoformat() if history.watched_at else None,
-            "completed": history.completed
-        }
-        for history in histories
-    ]
+    """Get all watch history for the current user
+
+    With `expand=movie` each entry includes a summary of the movie.
+    """
+    if expand not in (None, "movie"):
+        raise HTTPException(
+            status_code=400,
+            detail="Unsupported expand value, use expand=movie"
+        )
+
+    result = await db.execute(
+        select(WatchHistory).where(WatchHistory.user_id == current_user.id))
+    histories = {
+        history.content_id: history_values(history)
+        for history in result.scalars().all()
+    }
+
+    # Writes and progress that are not stored yet are newer than the stored entries
+    for content_id, values in unsaved_history(current_user.id).items():
+        histories[content_id] = {**histories.get(content_id, {}), **values}
+    response_list = [history_response(values) for values in histories.values()]
+
+    if expand == "movie":
+        summaries = await movie_summaries.get_many(histories)
+        for response_dict in response_list:
+            response_dict["movie"] = summaries[response_dict["content_id"]]
     return response_list
 
 
 @history_router.get("/{content_id}", response_model=WatchHistoryResponse)
-def get_watch_history(
+async def get_watch_history(
     content_id: str,
-    history: WatchHistory = Depends(check_watch_history_owner),
-    db: Session = Depends(get_db)
+    current_user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific watch history entry"""
-    # Convert the response to a dictionary with the watched_at field as a string
-    response_dict = {
-        "user_id": history.user_id,
-        "content_id": history.content_id,
-        "watched_at": history.watched_at.isoformat() if history.watched_at else None,
-        "completed": history.completed
-    }
-    return response_dict
+    values = unsaved_history(current_user.id).get(content_id, {})
+    # Only read the stored entry for the columns not written since
+    if not all(column in values for column in HISTORY_COLUMNS):
+        result = await db.execute(select(WatchHistory).where(
+            WatchHistory.user_id == current_user.id,
+            WatchHistory.content_id == content_id
+        ))
+        history = result.scalars().first()
+        if history is None and not values:
+            raise HTTPException(status_code=404, detail="Watch history not found")
+        if history is not None:
+            values = {**history_values(history), **values}
+    return history_response(values)
 
 
 @history_router.put("/{content_id}", response_model=WatchHistoryResponse)
-def update_watch_history(
+async def update_watch_history(
     content_id: str,
     completed: bool,
     history: WatchHistory = Depends(check_watch_history_owner),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a watch history entry"""
     history.completed = completed
-    db.commit()
-    db.refresh(history)
-
-    # Convert the response to a dictionary with the watched_at field as a string
-    response_dict = {
-        "user_id": history.user_id,
-        "content_id": history.content_id,
-        "watched_at": history.watched_at.isoformat() if history.watched_at else None,
-        "completed": history.completed
-    }
-    return response_dict
+    await db.commit()
+    await db.refresh(history)
+
+    # Keep the next progress save from overwriting the change
+    progress_tracker.set_completed(history.user_id, content_id, completed)
+    return history_response(history_values(history))
 
 
 @history_router.delete("/{content_id}", response_model=WatchHistoryResponse)
-def delete_watch_history(
+async def delete_watch_history(
     content_id: str,
     history: WatchHistory = Depends(check_watch_history_owner),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a watch history entry"""
-    db.delete(history)
-    db.commit()
-
-    # Convert the response to a dictionary with the watched_at field as a string
-    response_dict = {
-        "user_id": history.user_id,
-        "content_id": history.content_id,
-        "watched_at": history.watched_at.isoformat() if history.watched_at else None,
-        "completed": history.completed
-    }
-    return response_dict
+    progress_tracker.discard(history.user_id, content_id)
+    await db.delete(history)
+    await db.commit()
+    return history_response(history_values(history))
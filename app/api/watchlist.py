@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db, upsert
 from app.models import Watchlist
 from app.auth.utils import check_watchlist_owner, create_authenticated_router
 from app.auth.auth import get_current_user
+from app.tmdb.summary import MovieSummary, movie_summaries
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
@@ -28,6 +30,8 @@ class WatchlistResponse(BaseModel):
     user_id: int
     content_id: str
     added_at: datetime
+    # Only set with ?expand=movie
+    movie: Optional[MovieSummary] = None
 
     class Config:
         from_attributes = True
@@ -37,38 +41,35 @@ class WatchlistResponse(BaseModel):
 
 
 @watchlist_router.post("/", response_model=WatchlistResponse)
-def create_watchlist(
+async def create_watchlist(
     watchlist: WatchlistCreate,
     current_user=Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Create a new watchlist item"""
+    """Add a movie to the watchlist, returning the existing item if it is already there"""
     try:
-        # Check if movie already exists in user's watchlist
-        existing_item = db.query(Watchlist).filter(
+        # A single statement that relies on the unique (user_id, content_id)
+        # index, so concurrent adds of the same movie cannot create duplicates
+        await db.execute(upsert(
+            db,
+            Watchlist,
+            {
+                "user_id": current_user.id,
+                "content_id": watchlist.content_id,
+                "added_at": datetime.utcnow()
+            },
+            keys=["user_id", "content_id"]
+        ))
+        result = await db.execute(select(Watchlist).where(
             Watchlist.user_id == current_user.id,
             Watchlist.content_id == watchlist.content_id
-        ).first()
-
-        if existing_item:
-            raise HTTPException(
-                status_code=400,
-                detail="Movie already in watchlist"
-            )
-
-        # Create new watchlist item
-        new_watchlist = Watchlist(
-            user_id=current_user.id,
-            content_id=watchlist.content_id
-        )
-
-        db.add(new_watchlist)
-        db.commit()
-        db.refresh(new_watchlist)
-        return new_watchlist
+        ))
+        item = result.scalars().one()
+        await db.commit()
+        return item
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Error creating watchlist: {str(e)}"
@@ -76,42 +77,66 @@ def create_watchlist(
 
 
 @watchlist_router.get("/", response_model=List[WatchlistResponse])
-def get_user_watchlist(
+async def get_user_watchlist(
+    expand: Optional[str] = None,
     current_user=Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all watchlist items for the current user"""
-    return db.query(Watchlist).filter(Watchlist.user_id == current_user.id).all()
+    """Get all watchlist items for the current user
+
+    With `expand=movie` each item includes a summary of the movie.
+    """
+    if expand not in (None, "movie"):
+        raise HTTPException(
+            status_code=400,
+            detail="Unsupported expand value, use expand=movie"
+        )
+
+    result = await db.execute(
+        select(Watchlist).where(Watchlist.user_id == current_user.id))
+    items = result.scalars().all()
+    if expand != "movie":
+        return items
+
+    summaries = await movie_summaries.get_many(item.content_id for item in items)
+    return [
+        {
+            "id": item.id,
+            "user_id": item.user_id,
+            "content_id": item.content_id,
+            "added_at": item.added_at,
+            "movie": summaries[item.content_id]
+        }
+        for item in items
+    ]
 
 
 @watchlist_router.get("/{watchlist_id}", response_model=WatchlistResponse)
-def get_watchlist(
+async def get_watchlist(
     watchlist_id: int,
     watchlist: Watchlist = Depends(check_watchlist_owner),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific watchlist item"""
     return watchlist
 
 
 @watchlist_router.delete("/{content_id}/")
-def delete_watchlist(
+async def delete_watchlist(
     content_id: str,
     current_user=Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a watchlist item by content_id"""
-    watchlist_item = db.query(Watchlist).filter(
+    result = await db.execute(delete(Watchlist).where(
         Watchlist.user_id == current_user.id,
         Watchlist.content_id == content_id
-    ).first()
-
-    if not watchlist_item:
+    ))
+    if result.rowcount == 0:
         raise HTTPException(
             status_code=404,
             detail="Watchlist item not found"
         )
 
-    db.delete(watchlist_item)
-    db.commit()
+    await db.commit()
     return {"message": "Watchlist item deleted successfully"}
@@ -2,20 +2,23 @@ import json
 from fastapi import APIRouter, HTTPException, Depends, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-import requests
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+import httpx
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from typing import Optional
 from urllib.parse import urlencode
 from fastapi.responses import RedirectResponse
 
-from app.config import CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, SECRET
-from app.database import SessionLocal
+from app.config import AUTH_TRUST_TOKEN_CLAIMS, CLIENT_ID, GOOGLE_AUTH_URL, REDIRECT_URI, SECRET
+from app.auth.google import InvalidIdToken, exchange_code, verify_id_token
+from app.auth.passwords import OAUTH_ONLY_PASSWORD, password_hasher
+from app.auth.principal import Principal, principal_cache
+from app.deadline import DeadlineExceeded
+from app.database import get_async_db
 from app.models import User
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
 # JWT Configuration
@@ -49,14 +52,6 @@ class TokenRequest(BaseModel):
     code: str
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -76,49 +71,80 @@ def create_refresh_token(data: dict):
     return encoded_jwt
 
 
+async def load_principal(db: AsyncSession, user_id: int) -> Optional[Principal]:
+    """Get a user by id from the principal cache, querying the DB on a miss"""
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalars().first()
+    if user is None:
+        return None
+    principal = Principal.from_user(user)
+    principal_cache.set(principal)
+    return principal
+
+
+def token_data(principal: Principal) -> dict:
+    """Claims for the tokens issued to a user"""
+    return {"sub": str(principal.id), **principal.claims()}
+
+
+async def authenticate_token(db: AsyncSession, token: str) -> Optional[Principal]:
+    """Get the user an access token was issued to, or None if the token is invalid"""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = payload.get("sub")
+        if user_id is None:
+            return None
+        user_id = int(user_id)
+    except (JWTError, ValueError):
+        return None
+
+    if AUTH_TRUST_TOKEN_CLAIMS:
+        # Tokens issued before claims were added fall back to the lookup
+        principal = Principal.from_claims(user_id, payload)
+        if principal is not None:
+            return principal
+
+    return await load_principal(db, user_id)
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
+    db: AsyncSession = Depends(get_async_db)
+) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(credentials.credentials,
-                             SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
+    principal = await authenticate_token(db, credentials.credentials)
+    if principal is None:
         raise credentials_exception
-    return user
+    return principal
 
 auth_router = APIRouter(tags=["Auth"])
 
 
 @auth_router.post("/signup")
-def signup(user: UserCreate, db: Session = Depends(get_db)):
+async def signup(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Check if user exists
-    db_user = db.query(User).filter(User.email == user.email).first()
+    result = await db.execute(select(User).where(User.email == user.email))
+    db_user = result.scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # Create new user
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
 
     return {
         "id": db_user.id,
@@ -129,13 +155,19 @@ def signup(user: UserCreate, db: Session = Depends(get_db)):
 
 
 @auth_router.post("/login", response_model=Token)
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).where(User.email == user.email))
+    db_user = result.scalars().first()
     if not db_user:
         raise HTTPException(status_code=401, detail="Email not found")
 
-    if not pwd_context.verify(user.password, db_user.hashed_password):
+    verified, new_hash = await password_hasher.verify(user.password, db_user.hashed_password)
+    if not verified:
         raise HTTPException(status_code=401, detail="Incorrect password")
+    if new_hash is not None:
+        # Stored with a different bcrypt cost than configured
+        db_user.hashed_password = new_hash
+        await db.commit()
 
     user_data = {
         "id": db_user.id,
@@ -145,11 +177,12 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
         "created_at": db_user.created_at.strftime('%Y-%m-%d %H:%M:%S')
     }
 
+    principal = Principal.from_user(db_user)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": str(db_user.id)}, expires_delta=access_token_expires
+        data=token_data(principal), expires_delta=access_token_expires
     )
-    refresh_token = create_refresh_token(data={"sub": str(db_user.id)})
+    refresh_token = create_refresh_token(data=token_data(principal))
 
     return {
         "access_token": access_token,
@@ -164,14 +197,24 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
 
 @auth_router.post("/refresh", response_model=Token)
 async def refresh_token(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
+    if AUTH_TRUST_TOKEN_CLAIMS:
+        # Pick up changes to the user that the old token's claims predate
+        current_user = await load_principal(db, current_user.id)
+        if current_user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": str(current_user.id)}, expires_delta=access_token_expires
+        data=token_data(current_user), expires_delta=access_token_expires
     )
-    refresh_token = create_refresh_token(data={"sub": str(current_user.id)})
+    refresh_token = create_refresh_token(data=token_data(current_user))
 
     return {
         "access_token": access_token,
@@ -204,14 +247,13 @@ def google_login():
     }
 
     # Build the authorization URL with proper URL encoding
-    auth_url = f"https://accounts.google.com/o/oauth2/v2/auth?{
-        urlencode(auth_params)}"
+    auth_url = f"{GOOGLE_AUTH_URL}?{urlencode(auth_params)}"
 
     return {"auth_url": auth_url}
 
 
 @auth_router.get('/oauth2/callback')
-async def oauth2_callback(request: Request, db: Session = Depends(get_db)):
+async def oauth2_callback(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Handle Google OAuth callback"""
     try:
         # Get the code from query parameters
@@ -222,69 +264,58 @@ async def oauth2_callback(request: Request, db: Session = Depends(get_db)):
                 detail="No authorization code found"
             )
 
-        token_url = 'https://oauth2.googleapis.com/token'
-        data = {
-            'client_id': CLIENT_ID,
-            'client_secret': CLIENT_SECRET,
-            'code': code,
-            'redirect_uri': REDIRECT_URI,
-            'grant_type': 'authorization_code'
-        }
-
-        # Exchange code for tokens
-        token_response = requests.post(token_url, data=data)
-
-        if not token_response.ok:
-            error_detail = token_response.json()
+        # Exchange the code for tokens, bounded by the request's latency budget
+        try:
+            tokens = await exchange_code(code)
+        except httpx.HTTPStatusError as e:
             raise HTTPException(
                 status_code=400,
-                detail=f"Failed to exchange code: {error_detail}"
+                detail=f"Failed to exchange code: {e.response.text}"
             )
 
-        token_data = token_response.json()
-
-        # Get user info from Google
-        user_info_response = requests.get(
-            'https://www.googleapis.com/oauth2/v3/userinfo',
-            headers={'Authorization': f"Bearer {token_data['access_token']}"}
-        )
-        user_info_response.raise_for_status()
-        user_info = user_info_response.json()
+        # Identify the user from the signed id_token instead of asking userinfo
+        try:
+            user_info = await verify_id_token(
+                tokens.get("id_token", ""), tokens.get("access_token"))
+        except InvalidIdToken as e:
+            raise HTTPException(
+                status_code=400, detail=f"Invalid id_token: {str(e)}")
 
         # Extract user information
         email = user_info.get("email")
-        # Use email prefix if name not provided
-        name = user_info.get("name", email.split('@')[0])
-        picture = user_info.get("picture")
-
         if not email:
             raise HTTPException(
                 status_code=400, detail="Email not provided by Google")
+        # Use email prefix if name not provided
+        name = user_info.get("name", email.split('@')[0])
+        picture = user_info.get("picture")
 
         # Check if user exists
-        db_user = db.query(User).filter(User.email == email).first()
+        result = await db.execute(select(User).where(User.email == email))
+        db_user = result.scalars().first()
         if not db_user:
             # Create new user with Google data
             db_user = User(
                 username=name,
                 email=email,
                 profile_picture=picture,
-                # Empty password for OAuth users
-                hashed_password=pwd_context.hash(""),
+                # No password for OAuth users
+                hashed_password=OAUTH_ONLY_PASSWORD,
                 is_active=True
             )
             db.add(db_user)
-            db.commit()
-            db.refresh(db_user)
+            await db.commit()
+            await db.refresh(db_user)
         else:
             print(f"\nFound existing user with email: {email}")
 
         # Create tokens
+        principal = Principal.from_user(db_user)
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": str(db_user.id)}, expires_delta=access_token_expires
+            data=token_data(principal), expires_delta=access_token_expires
         )
-        refresh_token = create_refresh_token(data={"sub": str(db_user.id)})
+        refresh_token = create_refresh_token(data=token_data(principal))
 
         # Redirect to frontend with tokens
         response_data = {
@@ -317,7 +348,11 @@ async def oauth2_callback(request: Request, db: Session = Depends(get_db)):
             status_code=302
         )
 
-    except requests.RequestException as e:
+    except HTTPException:
+        raise
+    except httpx.TimeoutException:
+        raise DeadlineExceeded()
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=400,
             detail=f"Error during Google OAuth: {str(e)}"
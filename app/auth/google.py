@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Dict, Optional
+
+import httpx
+from jose import JWTError, jwt
+
+from app.config import (
+    CLIENT_ID,
+    CLIENT_SECRET,
+    GOOGLE_ISSUERS,
+    GOOGLE_JWKS_MIN_REFRESH_INTERVAL,
+    GOOGLE_JWKS_TTL,
+    GOOGLE_JWKS_URL,
+    GOOGLE_TOKEN_URL,
+    REDIRECT_URI,
+    UPSTREAM_CONNECT_TIMEOUT,
+    UPSTREAM_DEFAULT_TIMEOUT,
+)
+from app.deadline import current_deadline
+
+logger = logging.getLogger("corsair_stream.auth")
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+# Shared client, created on startup and closed on shutdown (see main.py)
+_client: Optional[httpx.AsyncClient] = None
+
+
+class InvalidIdToken(Exception):
+    """The id_token returned by Google could not be verified"""
+
+
+async def start_google_client() -> httpx.AsyncClient:
+    """Create the shared client for Google OAuth requests"""
+    return get_google_client()
+
+
+async def close_google_client():
+    """Close the shared Google client and its pooled connections"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_google_client() -> httpx.AsyncClient:
+    """Get the shared Google client, created lazily outside the app lifespan"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient()
+    return _client
+
+
+def _timeout() -> httpx.Timeout:
+    deadline = current_deadline.get()
+    if deadline is not None:
+        deadline.check()
+        return deadline.httpx_timeout()
+    return httpx.Timeout(UPSTREAM_DEFAULT_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT)
+
+
+class GoogleKeySet:
+    """Google's id_token signing keys (JWKS), cached by key id.
+
+    The set is refetched once it expires, or when a token is signed with an
+    unknown key id, at most once per `min_refresh_interval`.
+    """
+
+    def __init__(self, url: str, ttl: float, min_refresh_interval: float):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: Dict[str, dict] = {}
+        self._expires_at = 0.0
+        self._fetched_at = float("-inf")
+        self._lock = asyncio.Lock()
+        self.refreshes = 0
+
+    async def get_key(self, kid: str) -> Optional[dict]:
+        if kid in self._keys and self._expires_at > time.monotonic():
+            return self._keys[kid]
+        async with self._lock:
+            # Another request may have refreshed the set while we waited
+            expired = self._expires_at <= time.monotonic()
+            if expired or (kid not in self._keys and self._can_refresh()):
+                try:
+                    await self._refresh()
+                except httpx.HTTPError as e:
+                    if not self._keys:
+                        raise
+                    # Keys rotate slowly, keep verifying with the ones we have
+                    logger.warning(f"Refreshing Google signing keys failed: {str(e)}")
+        return self._keys.get(kid)
+
+    def _can_refresh(self) -> bool:
+        return time.monotonic() - self._fetched_at >= self.min_refresh_interval
+
+    async def _refresh(self):
+        response = await get_google_client().get(self.url, timeout=_timeout())
+        response.raise_for_status()
+        self._keys = {key["kid"]: key for key in response.json().get("keys", [])}
+        match = _MAX_AGE.search(response.headers.get("Cache-Control", ""))
+        ttl = float(match.group(1)) if match else self.ttl
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + ttl
+        self.refreshes += 1
+        logger.info(f"Loaded {len(self._keys)} Google signing keys")
+
+
+async def exchange_code(code: str) -> dict:
+    """Exchange an authorization code for Google tokens.
+
+    Raises:
+        httpx.HTTPStatusError: If Google rejects the code
+        httpx.HTTPError: If the request fails
+    """
+    response = await get_google_client().post(
+        GOOGLE_TOKEN_URL,
+        data={
+            "client_id": CLIENT_ID,
+            "client_secret": CLIENT_SECRET,
+            "code": code,
+            "redirect_uri": REDIRECT_URI,
+            "grant_type": "authorization_code"
+        },
+        timeout=_timeout()
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+async def verify_id_token(id_token: str, access_token: Optional[str] = None) -> dict:
+    """Verify an id_token's signature and claims against the cached JWKS.
+
+    Returns:
+        The token claims, including email, name and picture
+
+    Raises:
+        InvalidIdToken: If the token is malformed, signed by an unknown key,
+            expired, or issued for another client
+    """
+    try:
+        header = jwt.get_unverified_header(id_token)
+    except JWTError as e:
+        raise InvalidIdToken(str(e))
+    key = await google_keys.get_key(header.get("kid", ""))
+    if key is None:
+        raise InvalidIdToken("Unknown signing key")
+    try:
+        claims = jwt.decode(
+            id_token,
+            key,
+            algorithms=[key.get("alg", "RS256")],
+            audience=CLIENT_ID,
+            issuer=GOOGLE_ISSUERS,
+            access_token=access_token
+        )
+    except JWTError as e:
+        raise InvalidIdToken(str(e))
+    if not claims.get("email_verified", False):
+        raise InvalidIdToken("Email address is not verified")
+    return claims
+
+
+# Shared key set for verifying Google id_tokens
+google_keys = GoogleKeySet(
+    url=GOOGLE_JWKS_URL,
+    ttl=GOOGLE_JWKS_TTL,
+    min_refresh_interval=GOOGLE_JWKS_MIN_REFRESH_INTERVAL
+)
@@ -0,0 +1,132 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from app.config import PASSWORD_BCRYPT_ROUNDS, PASSWORD_HASH_MAX_QUEUE, PASSWORD_HASH_WORKERS
+
+# Stored instead of a hash for users that only sign in with Google. It is not
+# a valid bcrypt hash, so no password ever verifies against it.
+OAUTH_ONLY_PASSWORD = "!oauth-only"
+
+
+class PasswordHashingBusy(HTTPException):
+    """Too many hashing jobs are already waiting for a worker"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=503,
+            detail="Authentication service is busy, please retry shortly",
+            headers={"Retry-After": "1"}
+        )
+
+
+@lru_cache(maxsize=None)
+def _context(rounds: int) -> CryptContext:
+    # Hashes outside the configured cost are flagged for rehashing
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds
+    )
+
+
+# Run in the worker processes
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+
+def _verify_and_update(password: str, hashed: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return _context(rounds).verify_and_update(password, hashed)
+
+
+class PasswordHasher:
+    """Bcrypt hashing on a bounded process pool.
+
+    At most `workers` jobs run at once and `max_queue` more may wait. Past
+    that, callers get PasswordHashingBusy (503) instead of queueing.
+    """
+
+    def __init__(self, workers: int, max_queue: int, rounds: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.upgraded = 0
+
+    def start(self):
+        if self._executor is None:
+            # Forking the threaded server process can deadlock a worker on a
+            # lock held by another thread, so workers start from a clean one
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("forkserver")
+            )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordHashingBusy()
+        self.start()
+        self._pending += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._pending -= 1
+        self.completed += 1
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Check a password against a stored hash.
+
+        Returns:
+            Whether it matches, and a new hash to store when the stored one
+            was made with a different cost
+        """
+        # Google users created before OAUTH_ONLY_PASSWORD store a hash of ""
+        if not password or not hashed or hashed == OAUTH_ONLY_PASSWORD:
+            return False, None
+        verified, new_hash = await self._run(
+            _verify_and_update, password, hashed, self.rounds)
+        if new_hash is not None:
+            self.upgraded += 1
+        return verified, new_hash
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "upgraded": self.upgraded
+        }
+
+
+# Shared hasher, its pool is started and stopped with the app (see main.py)
+password_hasher = PasswordHasher(
+    workers=PASSWORD_HASH_WORKERS,
+    max_queue=PASSWORD_HASH_MAX_QUEUE,
+    rounds=PASSWORD_BCRYPT_ROUNDS
+)
@@ -0,0 +1,114 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from sqlalchemy import event
+
+from app.config import AUTH_PRINCIPAL_CACHE_MAX_ENTRIES, AUTH_PRINCIPAL_CACHE_TTL
+from app.models import User
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user, detached from any database session"""
+    id: int
+    username: str
+    email: str
+    profile_picture: Optional[str] = None
+    is_active: bool = True
+    is_admin: bool = False
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            profile_picture=user.profile_picture,
+            is_active=bool(user.is_active),
+            is_admin=bool(user.is_admin)
+        )
+
+    def claims(self) -> dict:
+        """Token claims from which the principal can be rebuilt"""
+        return {
+            "username": self.username,
+            "email": self.email,
+            "picture": self.profile_picture,
+            "active": self.is_active,
+            "admin": self.is_admin
+        }
+
+    @classmethod
+    def from_claims(cls, user_id: int, payload: dict) -> Optional["Principal"]:
+        """Rebuild a principal from token claims, None if the token has none"""
+        if "username" not in payload or "email" not in payload:
+            return None
+        return cls(
+            id=user_id,
+            username=payload["username"],
+            email=payload["email"],
+            profile_picture=payload.get("picture"),
+            is_active=payload.get("active", True),
+            is_admin=payload.get("admin", False)
+        )
+
+
+class PrincipalCache:
+    """Principals by user id, with a TTL and LRU eviction past `max_entries`"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, Tuple[Principal, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[1] <= time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, principal: Principal):
+        self._entries[principal.id] = (principal, time.monotonic() + self.ttl)
+        self._entries.move_to_end(principal.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: int):
+        if self._entries.pop(user_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions
+        }
+
+
+# Shared cache used by get_current_user
+principal_cache = PrincipalCache(AUTH_PRINCIPAL_CACHE_MAX_ENTRIES, AUTH_PRINCIPAL_CACHE_TTL)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target: User):
+    # Profile updates, deactivation and admin changes all go through the ORM
+    principal_cache.invalidate(target.id)
@@ -1,15 +1,19 @@
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import User, Watchlist, WatchHistory
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
+from app.history_buffer import history_buffer
+from app.models import Watchlist, WatchHistory
 from app.auth.auth import get_current_user
+from app.auth.principal import Principal
 
 
-def check_watchlist_owner(watchlist_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def check_watchlist_owner(watchlist_id: int, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """Check if user owns the watchlist"""
-    watchlist = db.query(Watchlist).filter(
-        Watchlist.id == watchlist_id).first()
+    result = await db.execute(
+        select(Watchlist).where(Watchlist.id == watchlist_id))
+    watchlist = result.scalars().first()
     if not watchlist:
         raise HTTPException(status_code=404, detail="Watchlist not found")
     if current_user.id != watchlist.user_id:
@@ -18,18 +22,22 @@ def check_watchlist_owner(watchlist_id: int, current_user: User = Depends(get_cu
     return watchlist
 
 
-def check_watch_history_owner(content_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def check_watch_history_owner(content_id: str, current_user: Principal = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """Check if user owns the watch history entry"""
-    history = db.query(WatchHistory).filter(
+    if history_buffer.get(current_user.id, content_id) is not None:
+        # Store the buffered write first, so the entry is changed or deleted in the DB
+        await history_buffer.store(db, current_user.id, content_id)
+    result = await db.execute(select(WatchHistory).where(
         WatchHistory.user_id == current_user.id,
         WatchHistory.content_id == content_id
-    ).first()
+    ))
+    history = result.scalars().first()
     if not history:
         raise HTTPException(status_code=404, detail="Watch history not found")
     return history
 
 
-def check_admin(current_user: User = Depends(get_current_user)):
+def check_admin(current_user: Principal = Depends(get_current_user)):
     """Check if user is an admin"""
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
@@ -14,10 +14,64 @@ DB_PASS = os.getenv("DB_PASS")
 DB_NAME = os.getenv("DB_NAME")
 SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{
     DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+ASYNC_SQLALCHEMY_DATABASE_URI = f'mysql+aiomysql://{
+    DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+
+# Connection pool, applied to both the sync and the async engine
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+# Seconds to wait for a connection before giving up
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+# Recycle connections before MySQL's wait_timeout closes them
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+# Report connections and queries used per request in X-DB-* response headers
+DB_USAGE_HEADERS = os.getenv("DB_USAGE_HEADERS", "false").lower() == "true"
+
+# Write-behind watch history: events are buffered in memory, deduplicated per
+# (user_id, content_id) and written in batched upserts. Buffered entries are
+# lost if the process dies without a graceful shutdown.
+HISTORY_WRITE_BEHIND = os.getenv(
+    "HISTORY_WRITE_BEHIND", "false").lower() == "true"
+HISTORY_FLUSH_INTERVAL_MS = int(os.getenv("HISTORY_FLUSH_INTERVAL_MS", 500))
+# Rows per upsert statement, a full batch is flushed right away
+HISTORY_FLUSH_MAX_ROWS = int(os.getenv("HISTORY_FLUSH_MAX_ROWS", 500))
+HISTORY_BUFFER_MAX_ENTRIES = int(os.getenv("HISTORY_BUFFER_MAX_ENTRIES", 10000))
+# Seconds a write waits for room in a full buffer before getting 503
+HISTORY_BUFFER_MAX_WAIT = float(os.getenv("HISTORY_BUFFER_MAX_WAIT", 1))
+
+# Playback progress heartbeats are kept in memory per viewer and stored on a
+# seek, a duration or completion change, or every PROGRESS_PERSIST_INTERVAL
+PROGRESS_PERSIST_INTERVAL = float(os.getenv("PROGRESS_PERSIST_INTERVAL", 60))
+# Seconds a position may be off from where playback should be before it
+# counts as a seek
+PROGRESS_SEEK_TOLERANCE = float(os.getenv("PROGRESS_SEEK_TOLERANCE", 30))
+# Viewers without a heartbeat for this long are stored and forgotten
+PROGRESS_IDLE_TIMEOUT = float(os.getenv("PROGRESS_IDLE_TIMEOUT", 120))
+# Share of the duration after which a title counts as completed
+PROGRESS_COMPLETION_THRESHOLD = float(
+    os.getenv("PROGRESS_COMPLETION_THRESHOLD", 0.9))
+# Seconds a playback socket has to send its access token before it is closed
+PLAYBACK_AUTH_TIMEOUT = float(os.getenv("PLAYBACK_AUTH_TIMEOUT", 5))
 
 # JWT Configuration
 SECRET = os.getenv("SECRET")
 
+# Authenticated users cached by id, so authorized requests skip the user query
+AUTH_PRINCIPAL_CACHE_TTL = float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", 60))
+AUTH_PRINCIPAL_CACHE_MAX_ENTRIES = int(
+    os.getenv("AUTH_PRINCIPAL_CACHE_MAX_ENTRIES", 10000))
+# Build the user from the claims of the signed token, without any DB lookup.
+# Changes to a user only show up once their token is renewed.
+AUTH_TRUST_TOKEN_CLAIMS = os.getenv(
+    "AUTH_TRUST_TOKEN_CLAIMS", "false").lower() == "true"
+
+# Password hashing, done in a process pool off the event loop. Stored hashes
+# with a different bcrypt cost are rehashed on the next successful login.
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+# Hashing jobs allowed to wait for a worker before requests get 503
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 32))
+
 # Google OAuth Configuration
 CLIENT_ID = os.getenv("CLIENT_ID")
 if not CLIENT_ID:
@@ -31,6 +85,21 @@ REDIRECT_URI = os.getenv("REDIRECT_URI")
 if not REDIRECT_URI:
     raise ValueError("REDIRECT_URI environment variable is not set")
 
+# Google OAuth endpoints, overridable to point at a local stand-in server
+GOOGLE_AUTH_URL = os.getenv(
+    "GOOGLE_AUTH_URL", "https://accounts.google.com/o/oauth2/v2/auth")
+GOOGLE_TOKEN_URL = os.getenv(
+    "GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+GOOGLE_JWKS_URL = os.getenv(
+    "GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+GOOGLE_ISSUERS = os.getenv(
+    "GOOGLE_ISSUERS", "https://accounts.google.com,accounts.google.com").split(",")
+# Signing keys are kept for the max-age Google sends, or this default
+GOOGLE_JWKS_TTL = float(os.getenv("GOOGLE_JWKS_TTL", 60 * 60))
+# Minimum time between refreshes triggered by an unknown key id
+GOOGLE_JWKS_MIN_REFRESH_INTERVAL = float(
+    os.getenv("GOOGLE_JWKS_MIN_REFRESH_INTERVAL", 60))
+
 # TMDB Configuration
 TMDB_API_KEY = os.getenv("TMDB_API_KEY")
 TMDB_API_READ_ACCESS_TOKEN = os.getenv("TMDB_API_READ_ACCESS_TOKEN")
@@ -40,3 +109,93 @@ TMDB_HEADERS = {
     "Authorization": f"Bearer {TMDB_API_READ_ACCESS_TOKEN}",
     "Content-Type": "application/json"
 }
+
+# TMDB HTTP client configuration
+TMDB_HTTP2 = os.getenv("TMDB_HTTP2", "true").lower() == "true"
+TMDB_MAX_CONNECTIONS = int(os.getenv("TMDB_MAX_CONNECTIONS", 200))
+TMDB_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("TMDB_MAX_KEEPALIVE_CONNECTIONS", 50))
+TMDB_KEEPALIVE_EXPIRY = float(os.getenv("TMDB_KEEPALIVE_EXPIRY", 30))
+
+# TMDB response cache configuration
+TMDB_CACHE_MAX_BYTES = int(os.getenv("TMDB_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Proactive refresh of the most requested TMDB cache entries
+TMDB_REFRESH_TOP_N = int(os.getenv("TMDB_REFRESH_TOP_N", 50))
+TMDB_REFRESH_INTERVAL = float(os.getenv("TMDB_REFRESH_INTERVAL", 30))
+TMDB_REFRESH_AHEAD = float(os.getenv("TMDB_REFRESH_AHEAD", 60))
+
+# Batch movie lookups
+TMDB_BATCH_MAX_IDS = int(os.getenv("TMDB_BATCH_MAX_IDS", 200))
+TMDB_BATCH_CONCURRENCY = int(os.getenv("TMDB_BATCH_CONCURRENCY", 10))
+TMDB_BATCH_ITEM_TIMEOUT = float(os.getenv("TMDB_BATCH_ITEM_TIMEOUT", 5))
+
+# Movie summaries used to hydrate watchlist and history (?expand=movie)
+TMDB_SUMMARY_CACHE_MAX_BYTES = int(
+    os.getenv("TMDB_SUMMARY_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+TMDB_SUMMARY_TTL = float(os.getenv("TMDB_SUMMARY_TTL", 6 * 60 * 60))
+
+# Movie genre index, preloaded per language on startup
+TMDB_GENRE_LANGUAGES = os.getenv("TMDB_GENRE_LANGUAGES", "en-US").split(",")
+TMDB_GENRE_REFRESH_INTERVAL = float(
+    os.getenv("TMDB_GENRE_REFRESH_INTERVAL", 24 * 60 * 60))
+
+# ?fields= projections of TMDB payloads
+TMDB_PROJECTION_CACHE_MAX_BYTES = int(
+    os.getenv("TMDB_PROJECTION_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+TMDB_PROJECTION_SPEC_CACHE_SIZE = int(
+    os.getenv("TMDB_PROJECTION_SPEC_CACHE_SIZE", 256))
+
+# TMDB upstream governor: rate limit, adaptive concurrency and 429 backoff
+TMDB_RATE_LIMIT = float(os.getenv("TMDB_RATE_LIMIT", 40))
+TMDB_RATE_BURST = int(os.getenv("TMDB_RATE_BURST", 40))
+TMDB_MIN_CONCURRENCY = int(os.getenv("TMDB_MIN_CONCURRENCY", 4))
+TMDB_MAX_CONCURRENCY = int(os.getenv("TMDB_MAX_CONCURRENCY", 64))
+TMDB_INITIAL_CONCURRENCY = int(os.getenv("TMDB_INITIAL_CONCURRENCY", 16))
+TMDB_LATENCY_TARGET = float(os.getenv("TMDB_LATENCY_TARGET", 1.0))
+TMDB_MAX_RETRIES = int(os.getenv("TMDB_MAX_RETRIES", 2))
+TMDB_MAX_RETRY_WAIT = float(os.getenv("TMDB_MAX_RETRY_WAIT", 5))
+
+# TMDB circuit breaker
+TMDB_BREAKER_WINDOW_SECONDS = float(os.getenv("TMDB_BREAKER_WINDOW_SECONDS", 30))
+TMDB_BREAKER_MIN_CALLS = int(os.getenv("TMDB_BREAKER_MIN_CALLS", 20))
+TMDB_BREAKER_FAILURE_RATE = float(os.getenv("TMDB_BREAKER_FAILURE_RATE", 0.5))
+TMDB_BREAKER_SLOW_CALL_SECONDS = float(
+    os.getenv("TMDB_BREAKER_SLOW_CALL_SECONDS", 3))
+TMDB_BREAKER_SLOW_CALL_RATE = float(os.getenv("TMDB_BREAKER_SLOW_CALL_RATE", 0.8))
+TMDB_BREAKER_OPEN_SECONDS = float(os.getenv("TMDB_BREAKER_OPEN_SECONDS", 15))
+TMDB_BREAKER_HALF_OPEN_PROBES = int(
+    os.getenv("TMDB_BREAKER_HALF_OPEN_PROBES", 3))
+
+# Per-route latency budgets in seconds, matched by longest path prefix.
+# Upstream calls made by a request get timeouts from its remaining budget.
+ROUTE_BUDGETS = {
+    "/api/auth/oauth2/callback": 10.0,
+    "/api/movies/batch": 10.0,
+    "/api/search": 3.0,
+    "/api/": 5.0,
+}
+DEFAULT_ROUTE_BUDGET = float(os.getenv("DEFAULT_ROUTE_BUDGET", 10))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 2))
+# Timeout for upstream calls made outside a request (background refreshes)
+UPSTREAM_DEFAULT_TIMEOUT = float(os.getenv("UPSTREAM_DEFAULT_TIMEOUT", 10))
+
+# HTTP caching and compression of API responses.
+# Cache-Control per route, matched by longest path prefix.
+CACHE_CONTROL_RULES = {
+    "/api/auth": "no-store",
+    "/api/metrics": "no-store",
+    "/api/watchlist": "private, no-cache",
+    "/api/history": "private, no-cache",
+    "/api/genres": "public, max-age=86400",
+    "/api/watch/providers": "public, max-age=86400",
+    "/api/movie/": "public, max-age=3600",
+    "/api/search": "public, max-age=300",
+    "/api/": "public, max-age=600",
+}
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 5))
+# Compressed bodies of public responses, reused until evicted
+COMPRESSION_CACHE_MAX_BYTES = int(
+    os.getenv("COMPRESSION_CACHE_MAX_BYTES", 32 * 1024 * 1024))
@@ -1,14 +1,82 @@
+import time
+from typing import AsyncIterator, Iterable, List, Union
+
 from sqlalchemy import create_engine
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.config import (
+    ASYNC_SQLALCHEMY_DATABASE_URI,
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    SQLALCHEMY_DATABASE_URI,
+)
+
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": True,
+}
+
+
+class PoolWaitStats:
+    """Time requests spend waiting for a pooled connection"""
+
+    def __init__(self):
+        self.waiting = 0
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float):
+        self.checkouts += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
 
-from app.config import SQLALCHEMY_DATABASE_URI
+    def stats(self) -> dict:
+        return {
+            "waiters": self.waiting,
+            "checkouts": self.checkouts,
+            "avg_wait_ms": round(1000 * self.total_wait / self.checkouts, 2) if self.checkouts else 0.0,
+            "max_wait_ms": round(1000 * self.max_wait, 2)
+        }
 
 
-engine = create_engine(SQLALCHEMY_DATABASE_URI)
+pool_wait_stats = PoolWaitStats()
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """Async queue pool that records how long each checkout waits"""
+
+    def _do_get(self):
+        pool_wait_stats.waiting += 1
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait_stats.waiting -= 1
+            pool_wait_stats.record(time.perf_counter() - start)
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URI, **POOL_OPTIONS)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URI, poolclass=InstrumentedAsyncPool, **POOL_OPTIONS)
+
+# Objects stay usable after commit, without another round trip to reload them
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
@@ -26,3 +94,55 @@ def get_db() -> Session:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """Get an async database session, closed once the request is done.
+
+    Yields:
+        AsyncSession: A session on the async engine's connection pool
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def upsert(db: AsyncSession, model, values: Union[dict, List[dict]], keys: List[str], update: Iterable[str] = ()):
+    """Build a single INSERT that updates the existing row on a key conflict.
+
+    MySQL gets `INSERT ... ON DUPLICATE KEY UPDATE`, SQLite (used in local
+    runs) `INSERT ... ON CONFLICT DO UPDATE`. Without `update` columns an
+    existing row is left as it is.
+
+    Args:
+        model: Mapped class to insert into
+        values: Column values of the new row, or a list of rows
+        keys: Columns of the unique key the conflict is detected on
+        update: Columns overwritten with the new values on a conflict
+    """
+    update = list(update)
+    if db.get_bind().dialect.name == "sqlite":
+        statement = sqlite_insert(model).values(values)
+        if not update:
+            return statement.on_conflict_do_nothing(index_elements=keys)
+        return statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={column: statement.excluded[column] for column in update}
+        )
+    statement = mysql_insert(model).values(values)
+    if not update:
+        # Assigning a key column to itself leaves the row unchanged
+        return statement.on_duplicate_key_update({keys[0]: getattr(model, keys[0])})
+    return statement.on_duplicate_key_update(
+        {column: statement.inserted[column] for column in update})
+
+
+def pool_stats() -> dict:
+    """Connection pool usage of the async engine"""
+    pool = async_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        **pool_wait_stats.stats()
+    }
@@ -0,0 +1,58 @@
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.database import async_engine
+
+# Set per request by the middleware in main.py. Counts the pool checkouts and
+# statements of the request so tests can assert that a route shares a single
+# session and stays within its query budget.
+db_usage: ContextVar[Optional[dict]] = ContextVar("db_usage", default=None)
+
+
+def start_db_usage() -> dict:
+    """Start counting connections and queries for the current request"""
+    usage = {"connections": 0, "queries": 0}
+    db_usage.set(usage)
+    return usage
+
+
+def instrument_engine(engine: AsyncEngine):
+    """Count the checkouts and statements of an async engine per request"""
+
+    @event.listens_for(engine.sync_engine.pool, "checkout")
+    def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+        usage = db_usage.get()
+        if usage is not None:
+            usage["connections"] += 1
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count_query(conn, cursor, statement, parameters, context, executemany):
+        usage = db_usage.get()
+        if usage is not None:
+            usage["queries"] += 1
+
+
+def assert_db_usage(response, connections: int, max_queries: int):
+    """Check the DB usage a route reported in its response headers.
+
+    Needs DB_USAGE_HEADERS enabled. Meant for tests driving the app with
+    TestClient, e.g. `assert_db_usage(client.get("/api/watchlist/"), 1, 2)`.
+
+    Raises:
+        AssertionError: If the route went over either budget
+    """
+    used_connections = int(response.headers["X-DB-Connections"])
+    used_queries = int(response.headers["X-DB-Queries"])
+    # Raised explicitly, `assert` statements are stripped under python -O
+    if used_connections > connections:
+        raise AssertionError(
+            f"{response.request.url.path} used {used_connections} connections, expected at most {connections}")
+    if used_queries > max_queries:
+        raise AssertionError(
+            f"{response.request.url.path} ran {used_queries} queries, expected at most {max_queries}")
+
+
+instrument_engine(async_engine)
@@ -0,0 +1,89 @@
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+import httpx
+from fastapi import HTTPException
+
+from app.config import DEFAULT_ROUTE_BUDGET, ROUTE_BUDGETS, UPSTREAM_CONNECT_TIMEOUT
+
+
+class DeadlineExceeded(HTTPException):
+    """The request ran out of its latency budget"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=504,
+            detail="Request could not be completed within its time budget"
+        )
+
+
+class Deadline:
+    """Latency budget of a request, shared by all upstream calls it makes"""
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self):
+        """Raise DeadlineExceeded if no time is left for another call"""
+        if self.expired:
+            raise DeadlineExceeded()
+
+    def httpx_timeout(self) -> httpx.Timeout:
+        """Timeouts for one httpx call, capped by the remaining budget"""
+        remaining = self.remaining()
+        return httpx.Timeout(
+            remaining,
+            connect=min(UPSTREAM_CONNECT_TIMEOUT, remaining)
+        )
+
+
+# Deadline of the request being handled, set by the middleware in main.py
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+
+def get_route_budget(path: str) -> float:
+    """Get the latency budget for a request path, longest matching prefix wins"""
+    best = None
+    for prefix in ROUTE_BUDGETS:
+        if path.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return ROUTE_BUDGETS[best] if best is not None else DEFAULT_ROUTE_BUDGET
+
+
+# Requests that matched no route, e.g. 404s, share one entry
+UNMATCHED_ROUTE = "unmatched"
+
+
+class BudgetStats:
+    """Requests, budget overruns and 504s per route template"""
+
+    def __init__(self):
+        self.routes: Dict[str, Dict[str, int]] = {}
+
+    def record(self, route: Optional[str], deadline: Deadline, status_code: int):
+        stats = self.routes.setdefault(
+            route or UNMATCHED_ROUTE, {"requests": 0, "overruns": 0, "timeouts": 0})
+        stats["requests"] += 1
+        if deadline.elapsed() > deadline.budget:
+            stats["overruns"] += 1
+        if status_code == 504:
+            stats["timeouts"] += 1
+
+    def stats(self) -> dict:
+        return {route: dict(stats) for route, stats in self.routes.items()}
+
+
+budget_stats = BudgetStats()
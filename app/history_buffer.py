@@ -0,0 +1,329 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy.exc import DBAPIError, DisconnectionError, InterfaceError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import (
+    HISTORY_BUFFER_MAX_ENTRIES,
+    HISTORY_BUFFER_MAX_WAIT,
+    HISTORY_FLUSH_INTERVAL_MS,
+    HISTORY_FLUSH_MAX_ROWS,
+    HISTORY_WRITE_BEHIND,
+)
+from app.database import AsyncSessionLocal, upsert
+from app.models import WatchHistory
+
+logger = logging.getLogger("corsair_stream.history")
+
+HISTORY_KEYS = ["user_id", "content_id"]
+
+
+def _connection_lost(error: Exception) -> bool:
+    # A failure of the connection rather than of the rows written
+    return (isinstance(error, (DisconnectionError, InterfaceError))
+            or (isinstance(error, DBAPIError) and error.connection_invalidated))
+
+
+class HistoryBufferFull(HTTPException):
+    """The write-behind buffer stayed full for longer than the allowed wait"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=503,
+            detail="Watch history is busy, please retry shortly",
+            headers={"Retry-After": "1"}
+        )
+
+
+class HistoryBuffer:
+    """Write-behind buffer for watch history rows.
+
+    Writes are kept per user and content id, a later write replacing the
+    columns it sets in the pending one. A background task upserts them in
+    batches of `max_rows` every `flush_interval` seconds, or as soon as a
+    full batch is waiting.
+    Once `max_entries` rows are pending, writers wait up to `max_wait` for a
+    flush to make room and then get HistoryBufferFull (503).
+    """
+
+    def __init__(self, enabled: bool, flush_interval: float, max_rows: int,
+                 max_entries: int, max_wait: float):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.max_entries = max_entries
+        self.max_wait = max_wait
+        # user_id -> content_id -> row values
+        self._pending: Dict[int, Dict[str, dict]] = {}
+        # Rows of the flush in progress, still visible to reads
+        self._flushing: Dict[int, Dict[str, dict]] = {}
+        self._size = 0
+        self._lock = asyncio.Lock()
+        self._space = asyncio.Condition()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.writes = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.failed_flushes = 0
+        self.dropped_rows = 0
+        self.rejected = 0
+        self.last_flush_ms = 0.0
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write everything still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def add(self, values: dict):
+        """Buffer a row, waiting for room when the buffer is full"""
+        self.start()
+        user_id, content_id = values["user_id"], values["content_id"]
+        entries = self._pending.get(user_id, {})
+        if content_id not in entries and self._size >= self.max_entries:
+            await self._wait_for_space()
+            entries = self._pending.get(user_id, {})
+
+        if content_id in entries:
+            self.coalesced += 1
+        else:
+            self._size += 1
+        entries[content_id] = {**entries.get(content_id, {}), **values}
+        self._pending[user_id] = entries
+        self.writes += 1
+        if self._size >= self.max_rows:
+            self._wake.set()
+
+    async def _wait_for_space(self):
+        self._wake.set()
+        try:
+            async with self._space:
+                await asyncio.wait_for(
+                    self._space.wait_for(lambda: self._size < self.max_entries),
+                    self.max_wait
+                )
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HistoryBufferFull()
+
+    def get(self, user_id: int, content_id: str) -> Optional[dict]:
+        """Latest columns written for a user and content id that may not be stored yet"""
+        flushing = self._flushing.get(user_id, {}).get(content_id)
+        pending = self._pending.get(user_id, {}).get(content_id)
+        if flushing is None or pending is None:
+            return pending or flushing
+        return {**flushing, **pending}
+
+    def for_user(self, user_id: int) -> Dict[str, dict]:
+        """Columns written for a user that may not be stored yet, by content id"""
+        buffered = dict(self._flushing.get(user_id, {}))
+        for content_id, values in self._pending.get(user_id, {}).items():
+            buffered[content_id] = {**buffered.get(content_id, {}), **values}
+        return buffered
+
+    async def _take(self, user_id: int, content_id: str) -> Optional[dict]:
+        # Remove a pending row, once a flush already writing it has finished
+        if content_id in self._flushing.get(user_id, {}):
+            async with self._lock:
+                pass
+        entries = self._pending.get(user_id, {})
+        values = entries.pop(content_id, None)
+        if values is not None:
+            self._size -= 1
+            if not entries:
+                del self._pending[user_id]
+        return values
+
+    async def discard(self, user_id: int, content_id: str):
+        """Drop a pending row, once a flush already writing it has finished"""
+        await self._take(user_id, content_id)
+
+    async def store(self, db: AsyncSession, user_id: int, content_id: str):
+        """Write the pending row of one user and content id right away, on `db`"""
+        values = await self._take(user_id, content_id)
+        if values is None:
+            return
+        try:
+            await write_history(db, [values])
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            self._restore([values])
+            raise
+        self.rows_written += 1
+
+    async def flush(self) -> int:
+        """Write all pending rows.
+
+        Returns:
+            int: Number of rows written
+        """
+        async with self._lock:
+            if not self._size:
+                return 0
+            self._flushing, self._pending = self._pending, {}
+            self._size = 0
+            async with self._space:
+                self._space.notify_all()
+
+            rows = [values for entries in self._flushing.values()
+                    for values in entries.values()]
+            start = time.perf_counter()
+            dropped = self.dropped_rows
+            unwritten = rows
+            try:
+                unwritten = await self._write(rows)
+            finally:
+                self._restore(unwritten)
+                self._flushing = {}
+
+            written = len(rows) - len(unwritten) - (self.dropped_rows - dropped)
+            if written:
+                self.flushes += 1
+                self.rows_written += written
+                self.last_flush_ms = round(1000 * (time.perf_counter() - start), 2)
+            return written
+
+    async def _write(self, rows: List[dict]) -> List[dict]:
+        # Returns the rows to keep for the next flush
+        try:
+            async with AsyncSessionLocal() as db:
+                await write_history(db, rows, self.max_rows)
+                await db.commit()
+            return []
+        except Exception as e:
+            self.failed_flushes += 1
+            if _connection_lost(e):
+                logger.exception(f"Writing {len(rows)} watch history rows failed: {str(e)}")
+                return rows
+            logger.warning(
+                f"Writing {len(rows)} watch history rows failed, retrying one by one: {str(e)}")
+
+        # Drop the rows the database rejects, e.g. a too long content_id, so
+        # they don't hold back everyone else's
+        rejected = []
+        keep = []
+        async with AsyncSessionLocal() as db:
+            for index, values in enumerate(rows):
+                try:
+                    await write_history(db, [values])
+                    await db.commit()
+                except Exception as e:
+                    await db.rollback()
+                    if _connection_lost(e):
+                        keep = rows[index:]
+                        break
+                    rejected.append((values, e))
+        if len(rejected) + len(keep) == len(rows):
+            # Nothing went in, the database is more likely failing than every row
+            return rows
+        for values, e in rejected:
+            self.dropped_rows += 1
+            logger.error(
+                f"Dropping watch history row for user {values['user_id']} "
+                f"and content {values['content_id']}: {str(e)}")
+        return keep
+
+    def _restore(self, rows: List[dict]):
+        # Put unwritten rows back, under anything written since. Past
+        # max_entries they are dropped instead.
+        dropped = 0
+        for values in rows:
+            user_id, content_id = values["user_id"], values["content_id"]
+            entries = self._pending.get(user_id, {})
+            if content_id not in entries:
+                if self._size >= self.max_entries:
+                    dropped += 1
+                    continue
+                self._size += 1
+            entries[content_id] = {**values, **entries.get(content_id, {})}
+            self._pending[user_id] = entries
+        if dropped:
+            self.dropped_rows += dropped
+            logger.error(f"Dropping {dropped} unwritten watch history rows, the buffer is full")
+
+    async def _run(self):
+        logger.info(
+            f"Watch history write-behind started (every {self.flush_interval}s "
+            f"or {self.max_rows} rows)")
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.exception(f"Flushing watch history failed: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pending": self._size,
+            "max_entries": self.max_entries,
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "failed_flushes": self.failed_flushes,
+            "dropped_rows": self.dropped_rows,
+            "rejected": self.rejected,
+            "last_flush_ms": self.last_flush_ms
+        }
+
+
+async def write_history(db: AsyncSession, rows: List[dict], batch_size: int = HISTORY_FLUSH_MAX_ROWS):
+    """Upsert watch history rows, without committing.
+
+    Rows setting the same columns share a statement. An existing row keeps
+    the values of the columns a write leaves out.
+    """
+    batches: Dict[tuple, List[dict]] = {}
+    for values in rows:
+        batches.setdefault(tuple(sorted(values)), []).append(values)
+    for columns, batch in batches.items():
+        update = [column for column in columns if column not in HISTORY_KEYS]
+        for offset in range(0, len(batch), batch_size):
+            await db.execute(upsert(
+                db,
+                WatchHistory,
+                batch[offset:offset + batch_size],
+                keys=HISTORY_KEYS,
+                update=update
+            ))
+
+
+async def save_history(db: AsyncSession, rows: List[dict]):
+    """Store watch history rows, or buffer them when write-behind is on"""
+    if history_buffer.enabled:
+        for values in rows:
+            await history_buffer.add(values)
+        return
+    await write_history(db, rows)
+    await db.commit()
+
+
+# Shared buffer, flushed on shutdown (see main.py)
+history_buffer = HistoryBuffer(
+    enabled=HISTORY_WRITE_BEHIND,
+    flush_interval=HISTORY_FLUSH_INTERVAL_MS / 1000,
+    max_rows=HISTORY_FLUSH_MAX_ROWS,
+    max_entries=HISTORY_BUFFER_MAX_ENTRIES,
+    max_wait=HISTORY_BUFFER_MAX_WAIT
+)
@@ -0,0 +1,171 @@
+import gzip
+import hashlib
+from typing import Dict, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.config import (
+    CACHE_CONTROL_RULES,
+    COMPRESSION_BROTLI_QUALITY,
+    COMPRESSION_CACHE_MAX_BYTES,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_MIN_BYTES,
+)
+from app.tmdb.cache import ResponseCache
+
+try:
+    import brotli
+except ImportError:
+    # Brotli is optional, gzip is used without it
+    brotli = None
+
+# Compressed bodies are keyed by content hash, so they never go stale
+_COMPRESSED_TTL = 24 * 60 * 60
+
+compressed_cache = ResponseCache(COMPRESSION_CACHE_MAX_BYTES)
+# Responses given an ETag, answered with 304 and compressed
+compression_stats = {"responses": 0, "not_modified": 0, "compressed": 0, "bytes_saved": 0}
+
+
+def get_cache_control(path: str) -> Optional[str]:
+    """Get the Cache-Control header for a request path, longest matching prefix wins"""
+    best = None
+    for prefix in CACHE_CONTROL_RULES:
+        if path.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return CACHE_CONTROL_RULES[best] if best is not None else None
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag of a response body"""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def _parse_accept_encoding(value: str) -> Dict[str, float]:
+    encodings = {}
+    for part in value.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            encodings[name.strip().lower()] = q
+    return encodings
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick `br` or `gzip` from an Accept-Encoding header, None for identity"""
+    if not accept_encoding:
+        return None
+    accepted = _parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_q = None, 0.0
+    for encoding in candidates:
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def compress(body: bytes, encoding: str, digest: str, shared: bool) -> bytes:
+    """Compress a body, reusing an earlier result for the same content.
+
+    Only `shared` (public) bodies are kept, so catalog and TMDB payloads are
+    compressed once while per-user responses are not cached.
+    """
+    if not shared:
+        return _compress(body, encoding)
+    key = f"{encoding}:{digest}"
+    entry = compressed_cache.lookup(key)
+    if entry is not None:
+        return entry.value
+    compressed = _compress(body, encoding)
+    compressed_cache.set(key, compressed, ttl=_COMPRESSED_TTL, size=len(compressed))
+    return compressed
+
+
+def _is_compressible(content_type: str) -> bool:
+    return content_type.startswith(("application/json", "text/"))
+
+
+async def conditional_response(request: Request, response: Response) -> Response:
+    """Add ETag and Cache-Control to a GET response, answer 304 or compress it.
+
+    Strong ETags are derived from the body and differ per content coding,
+    e.g. `"<hash>"` for identity and `"<hash>-br"` for brotli.
+    """
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = [
+        (name, value) for name, value in response.raw_headers
+        if name not in (b"content-length", b"etag")
+    ]
+    result = Response(content=body, status_code=response.status_code)
+    result.raw_headers = headers + [(b"content-length", str(len(body)).encode())]
+
+    cache_control = get_cache_control(request.url.path)
+    if "x-cache-stale" in result.headers:
+        # A stale fallback must be revalidated, not kept for the route's max-age
+        cache_control = "no-cache"
+        result.headers["Cache-Control"] = cache_control
+    elif cache_control is not None and "cache-control" not in result.headers:
+        result.headers["Cache-Control"] = cache_control
+    if cache_control == "no-store":
+        return result
+
+    compression_stats["responses"] += 1
+    digest = make_etag(body)
+    encoding = None
+    if (len(body) >= COMPRESSION_MIN_BYTES
+            and "content-encoding" not in result.headers
+            and _is_compressible(result.headers.get("content-type", ""))):
+        encoding = choose_encoding(request.headers.get("accept-encoding"))
+        result.headers["Vary"] = "Accept-Encoding"
+    etag = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+    result.headers["ETag"] = etag
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        compression_stats["not_modified"] += 1
+        compression_stats["bytes_saved"] += len(body)
+        not_modified = Response(status_code=304)
+        not_modified.raw_headers = [
+            (name, value) for name, value in result.raw_headers
+            if name not in (b"content-length", b"content-type")
+        ]
+        return not_modified
+
+    if encoding is not None:
+        shared = cache_control is not None and cache_control.startswith("public")
+        compressed = compress(body, encoding, digest, shared)
+        compression_stats["compressed"] += 1
+        compression_stats["bytes_saved"] += len(body) - len(compressed)
+        result.body = compressed
+        result.headers["Content-Encoding"] = encoding
+        result.headers["Content-Length"] = str(len(compressed))
+    return result
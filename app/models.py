@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Text, Table
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String, Float, DateTime, Text, Table
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -25,6 +25,10 @@ class User(Base):
 
 class Watchlist(Base):
     __tablename__ = "watchlist"
+    __table_args__ = (
+        # A movie is on a user's watchlist at most once
+        Index("uq_watchlist_user_content", "user_id", "content_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("user.id"))
@@ -41,7 +45,9 @@ class WatchHistory(Base):
     user_id = Column(Integer, ForeignKey("user.id"), primary_key=True)
     content_id = Column(String(50), primary_key=True)
     watched_at = Column(DateTime, default=datetime.utcnow)
-    # watch_duration = Column(Integer)  # How many seconds watched, dont work
+    # Resume position and length of the title in seconds, from playback heartbeats
+    position = Column(Integer, default=0)
+    duration = Column(Integer)
     completed = Column(Boolean, default=False)
 
     # Relationships
@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import (
+    PROGRESS_COMPLETION_THRESHOLD,
+    PROGRESS_IDLE_TIMEOUT,
+    PROGRESS_PERSIST_INTERVAL,
+    PROGRESS_SEEK_TOLERANCE,
+)
+from app.database import AsyncSessionLocal
+from app.history_buffer import save_history
+
+logger = logging.getLogger("corsair_stream.history")
+
+
+@dataclass
+class ProgressState:
+    # Watch history row with the latest heartbeat
+    values: dict
+    # When the last heartbeat came in, and when a row was last stored
+    updated_at: float
+    saved_at: float
+    # Whether `values` has heartbeats that are not stored yet
+    dirty: bool = False
+
+
+class ProgressTracker:
+    """Playback positions of active viewers, kept in memory.
+
+    Each heartbeat replaces the viewer's position. It is only stored right
+    away on the first heartbeat, a seek, or a duration or completion change,
+    otherwise at most every `persist_interval` seconds. Viewers that stop
+    sending heartbeats are stored and dropped after `idle_timeout`.
+    """
+
+    def __init__(self, persist_interval: float, seek_tolerance: float,
+                 idle_timeout: float, completion_threshold: float):
+        self.persist_interval = persist_interval
+        self.seek_tolerance = seek_tolerance
+        self.idle_timeout = idle_timeout
+        self.completion_threshold = completion_threshold
+        # user_id -> content_id -> state
+        self._viewers: Dict[int, Dict[str, ProgressState]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.heartbeats = 0
+        self.coalesced = 0
+        self.saves = 0
+        self.rows_saved = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background saves and store every unsaved position"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._save_due(force=True)
+
+    def is_completed(self, position: int, duration: Optional[int]) -> bool:
+        return bool(duration) and position >= self.completion_threshold * duration
+
+    async def record(self, db: AsyncSession, user_id: int, content_id: str,
+                     position: int, duration: Optional[int] = None) -> dict:
+        """Record a heartbeat, storing it on `db` when it changes something that matters.
+
+        Returns:
+            dict: The viewer's watch history row
+        """
+        self.start()
+        self.heartbeats += 1
+        now = time.monotonic()
+        entries = self._viewers.setdefault(user_id, {})
+        state = entries.get(content_id)
+        if state is not None:
+            duration = duration or state.values["duration"]
+        completed = self.is_completed(position, duration)
+
+        if state is None:
+            meaningful = True
+        else:
+            previous = state.values
+            # Completion sticks until the viewer's next session
+            completed = completed or previous["completed"]
+            # Anywhere between paused and playing since the last heartbeat is not a seek
+            furthest = previous["position"] + (now - state.updated_at)
+            meaningful = (
+                position > furthest + self.seek_tolerance
+                or position < previous["position"] - self.seek_tolerance
+                or duration != previous["duration"]
+                or completed != previous["completed"]
+                or now - state.saved_at >= self.persist_interval
+            )
+
+        values = {
+            "user_id": user_id,
+            "content_id": content_id,
+            "watched_at": datetime.utcnow(),
+            "position": position,
+            "duration": duration,
+            "completed": completed
+        }
+        if state is None:
+            state = entries[content_id] = ProgressState(values, now, now)
+        state.values = values
+        state.updated_at = now
+        state.dirty = True
+
+        if not meaningful:
+            self.coalesced += 1
+            return values
+
+        await save_history(db, [values])
+        self._saved(state, values, now)
+        self.saves += 1
+        self.rows_saved += 1
+        return values
+
+    def _saved(self, state: ProgressState, values: dict, now: float):
+        state.saved_at = now
+        # A heartbeat that came in during the write is still unsaved
+        if state.values is values:
+            state.dirty = False
+
+    def set_completed(self, user_id: int, content_id: str, completed: bool) -> Optional[dict]:
+        """Apply a completion written outside of heartbeats to the viewer's progress.
+
+        Keeps later saves of the viewer's position from writing back the
+        completion it had before.
+
+        Returns:
+            The viewer's updated progress, or None if they are not watching
+        """
+        state = self._viewers.get(user_id, {}).get(content_id)
+        if state is None:
+            return None
+        state.values = {**state.values, "completed": completed}
+        return state.values
+
+    async def save_completed(self, db: AsyncSession, user_id: int, content_id: str,
+                             completed: bool) -> dict:
+        """Store a completion for a title, keeping the viewer's progress in step.
+
+        Returns:
+            dict: The watch history row, with the viewer's position if known
+        """
+        values = {
+            "user_id": user_id,
+            "content_id": content_id,
+            "watched_at": datetime.utcnow(),
+            "completed": completed
+        }
+        progress = self.set_completed(user_id, content_id, completed)
+        await save_history(db, [values])
+        return {**(progress or {}), **values}
+
+    def get(self, user_id: int, content_id: str) -> Optional[dict]:
+        """Latest progress of a user for a title, stored or not"""
+        state = self._viewers.get(user_id, {}).get(content_id)
+        return state.values if state is not None else None
+
+    def for_user(self, user_id: int) -> Dict[str, dict]:
+        """Latest progress of a user, by content id"""
+        return {content_id: state.values
+                for content_id, state in self._viewers.get(user_id, {}).items()}
+
+    def discard(self, user_id: int, content_id: str):
+        """Forget a viewer's progress without storing it"""
+        entries = self._viewers.get(user_id, {})
+        entries.pop(content_id, None)
+        if not entries:
+            self._viewers.pop(user_id, None)
+
+    async def _save_due(self, force: bool = False) -> int:
+        now = time.monotonic()
+        due: List[Tuple[ProgressState, dict]] = []
+        idle: List[Tuple[int, str, ProgressState]] = []
+        for user_id, entries in self._viewers.items():
+            for content_id, state in entries.items():
+                is_idle = now - state.updated_at >= self.idle_timeout
+                if state.dirty and (force or is_idle or now - state.saved_at >= self.persist_interval):
+                    due.append((state, state.values))
+                if is_idle:
+                    idle.append((user_id, content_id, state))
+
+        if due:
+            async with AsyncSessionLocal() as db:
+                await save_history(db, [values for _, values in due])
+            for state, values in due:
+                self._saved(state, values, now)
+            self.saves += 1
+            self.rows_saved += len(due)
+
+        # Only forget idle viewers once their position is stored
+        for user_id, content_id, state in idle:
+            entries = self._viewers.get(user_id, {})
+            if entries.get(content_id) is state and not state.dirty:
+                self.discard(user_id, content_id)
+        return len(due)
+
+    async def _run(self):
+        logger.info(
+            f"Playback progress tracking started (saved every {self.persist_interval}s)")
+        while True:
+            await asyncio.sleep(min(self.persist_interval, self.idle_timeout) / 2)
+            try:
+                await self._save_due()
+            except Exception as e:
+                logger.exception(f"Saving playback progress failed: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "viewers": sum(len(entries) for entries in self._viewers.values()),
+            "heartbeats": self.heartbeats,
+            "coalesced": self.coalesced,
+            "saves": self.saves,
+            "rows_saved": self.rows_saved
+        }
+
+
+# Shared tracker, unsaved positions are stored on shutdown (see main.py)
+progress_tracker = ProgressTracker(
+    persist_interval=PROGRESS_PERSIST_INTERVAL,
+    seek_tolerance=PROGRESS_SEEK_TOLERANCE,
+    idle_timeout=PROGRESS_IDLE_TIMEOUT,
+    completion_threshold=PROGRESS_COMPLETION_THRESHOLD
+)
@@ -0,0 +1,109 @@
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from app.config import TMDB_BATCH_CONCURRENCY, TMDB_BATCH_ITEM_TIMEOUT
+from app.tmdb.batch import gather_bounded
+from app.tmdb.cache import make_cache_key
+from app.tmdb.fetch import fetch_raw, peek_json, peek_raw
+
+# Sub-resources TMDB appends to the movie details payload
+DETAILS_APPEND = "videos,credits,similar"
+
+
+class MovieAggregateStore:
+    """Movie details with appended credits, videos and similar movies.
+
+    The aggregate is stored once per movie id in the TMDB response cache by
+    the details fetch. The credits, videos and similar endpoints are answered
+    by slicing it, so a detail page costs a single TMDB round trip.
+    """
+
+    def __init__(self, language: str = "en-US"):
+        self.language = language
+        self.slice_hits = 0
+        self.slice_misses = 0
+
+    def _params(self) -> dict:
+        return {
+            "language": self.language,
+            "append_to_response": DETAILS_APPEND
+        }
+
+    def key(self, movie_id: int) -> str:
+        """Response cache key of a movie's aggregate"""
+        return make_cache_key(f"/movie/{movie_id}", params=self._params())
+
+    async def get_raw(self, movie_id: int) -> bytes:
+        """Get the aggregate JSON body, fetching it from TMDB on a cache miss"""
+        return await fetch_raw(f"/movie/{movie_id}", params=self._params())
+
+    def peek_raw(self, movie_id: int) -> Optional[bytes]:
+        """Get the aggregate JSON body only if it is already cached"""
+        return peek_raw(f"/movie/{movie_id}", params=self._params())
+
+    def peek(self, movie_id: int) -> Optional[dict]:
+        """Get the decoded aggregate only if it is already cached"""
+        return peek_json(f"/movie/{movie_id}", params=self._params())
+
+    async def get_many(
+        self,
+        movie_ids: Iterable[int],
+        concurrency: int = TMDB_BATCH_CONCURRENCY,
+        timeout: float = TMDB_BATCH_ITEM_TIMEOUT
+    ) -> Dict[int, Tuple[Optional[bytes], Optional[BaseException]]]:
+        """Get aggregate JSON bodies for many movies.
+
+        Cached aggregates are returned directly; the rest are fetched from
+        TMDB concurrently, with at most `concurrency` requests in flight and
+        a per-movie timeout.
+
+        Returns:
+            A `(body, error)` pair per distinct movie id
+        """
+        results = {}
+        missing = []
+        for movie_id in dict.fromkeys(movie_ids):
+            body = self.peek_raw(movie_id)
+            if body is not None:
+                results[movie_id] = (body, None)
+            else:
+                missing.append(movie_id)
+
+        fetched = await gather_bounded(missing, self.get_raw, concurrency, timeout)
+        results.update(zip(missing, fetched))
+        return results
+
+    def _slice(self, movie_id: int, part: str) -> Optional[Any]:
+        aggregate = self.peek(movie_id)
+        if aggregate is None or part not in aggregate:
+            self.slice_misses += 1
+            return None
+        self.slice_hits += 1
+        return aggregate[part]
+
+    def credits(self, movie_id: int) -> Optional[dict]:
+        """Slice credits in the shape of TMDB's /movie/{id}/credits"""
+        credits = self._slice(movie_id, "credits")
+        if credits is None:
+            return None
+        return {"id": movie_id, **credits}
+
+    def videos(self, movie_id: int) -> Optional[dict]:
+        """Slice videos in the shape of TMDB's /movie/{id}/videos"""
+        videos = self._slice(movie_id, "videos")
+        if videos is None:
+            return None
+        return {"id": movie_id, **videos}
+
+    def similar(self, movie_id: int) -> Optional[dict]:
+        """Slice similar movies in the shape of TMDB's /movie/{id}/similar"""
+        return self._slice(movie_id, "similar")
+
+    def stats(self) -> dict:
+        return {
+            "slice_hits": self.slice_hits,
+            "slice_misses": self.slice_misses
+        }
+
+
+# Shared store for the movie details endpoints
+movie_aggregates = MovieAggregateStore()
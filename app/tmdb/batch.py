@@ -0,0 +1,35 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+async def gather_bounded(
+    items: Iterable[T],
+    fn: Callable[[T], Awaitable[Any]],
+    concurrency: int,
+    timeout: Optional[float] = None
+) -> List[Tuple[Any, Optional[BaseException]]]:
+    """Run `fn` for every item with at most `concurrency` calls in flight.
+
+    A failure or timeout of one item does not affect the others.
+
+    Args:
+        items: Inputs to process
+        fn: Coroutine function called once per item
+        concurrency: Maximum number of concurrent calls
+        timeout: Per-item timeout in seconds, measured once the call starts
+
+    Returns:
+        A `(result, error)` pair per item, in input order
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(item: T) -> Tuple[Any, Optional[BaseException]]:
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(fn(item), timeout), None
+            except Exception as e:
+                return None, e
+
+    return await asyncio.gather(*(run(item) for item in items))
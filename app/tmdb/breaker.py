@@ -0,0 +1,160 @@
+import logging
+import time
+from collections import deque
+from enum import Enum
+from typing import Deque, Dict, Tuple
+
+from fastapi import HTTPException
+
+from app.config import (
+    TMDB_BREAKER_FAILURE_RATE,
+    TMDB_BREAKER_HALF_OPEN_PROBES,
+    TMDB_BREAKER_MIN_CALLS,
+    TMDB_BREAKER_OPEN_SECONDS,
+    TMDB_BREAKER_SLOW_CALL_SECONDS,
+    TMDB_BREAKER_SLOW_CALL_RATE,
+    TMDB_BREAKER_WINDOW_SECONDS,
+)
+
+logger = logging.getLogger("corsair_stream.tmdb")
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpen(HTTPException):
+    """TMDB is considered down and nothing usable is cached"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail="Movie service is temporarily unavailable",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.5)))}
+        )
+
+
+class CircuitBreaker:
+    """Fail fast while TMDB is failing or too slow.
+
+    Calls are recorded over a rolling time window. Once at least `min_calls`
+    were made in the window and the share of failed or slow calls reaches its
+    threshold, the circuit opens and calls are rejected for `open_seconds`.
+    It then goes half-open and lets `half_open_probes` calls through: if they
+    all succeed the circuit closes, any failure opens it again.
+    """
+
+    def __init__(self, window_seconds: float, min_calls: int, failure_rate: float,
+                 slow_call_seconds: float, slow_call_rate: float, open_seconds: float,
+                 half_open_probes: int):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CircuitState.CLOSED
+        # (timestamp, failed, slow) per call
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_succeeded = 0
+        self.rejected = 0
+        self.transitions: Dict[str, int] = {}
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit lets a probe through"""
+        return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def allow(self) -> bool:
+        """Check whether a call may go upstream, reserving a probe if half-open"""
+        if self.state == CircuitState.OPEN:
+            if self.retry_after() > 0:
+                self.rejected += 1
+                return False
+            self._transition(CircuitState.HALF_OPEN)
+        if self.state == CircuitState.HALF_OPEN:
+            if self._probes_started >= self.half_open_probes:
+                self.rejected += 1
+                return False
+            self._probes_started += 1
+        return True
+
+    def is_open(self) -> bool:
+        return self.state == CircuitState.OPEN and self.retry_after() > 0
+
+    def check(self):
+        """Reserve a call or raise CircuitOpen"""
+        if not self.allow():
+            raise CircuitOpen(self.retry_after() or self.open_seconds)
+
+    def abandon(self):
+        """Give back a probe reserved for a call that was cancelled"""
+        if self.state == CircuitState.HALF_OPEN and self._probes_started > 0:
+            self._probes_started -= 1
+
+    def record(self, failed: bool, latency: float):
+        """Record the outcome of a call that `allow` let through"""
+        slow = latency > self.slow_call_seconds
+        if self.state == CircuitState.HALF_OPEN:
+            if failed or slow:
+                self._transition(CircuitState.OPEN)
+                return
+            self._probes_succeeded += 1
+            if self._probes_succeeded >= self.half_open_probes:
+                self._transition(CircuitState.CLOSED)
+            return
+        if self.state == CircuitState.OPEN:
+            # A call that started before the circuit opened
+            return
+
+        now = time.monotonic()
+        self._calls.append((now, failed, slow))
+        while self._calls and self._calls[0][0] < now - self.window_seconds:
+            self._calls.popleft()
+
+        total = len(self._calls)
+        if total < self.min_calls:
+            return
+        failures = sum(1 for _, call_failed, _ in self._calls if call_failed)
+        slow_calls = sum(1 for _, _, call_slow in self._calls if call_slow)
+        if failures / total >= self.failure_rate or slow_calls / total >= self.slow_call_rate:
+            self._transition(CircuitState.OPEN)
+
+    def _transition(self, state: CircuitState):
+        transition = f"{self.state.value}->{state.value}"
+        self.transitions[transition] = self.transitions.get(transition, 0) + 1
+        log = logger.info if state == CircuitState.CLOSED else logger.warning
+        log(f"TMDB circuit breaker {transition}")
+
+        self.state = state
+        self._probes_started = 0
+        self._probes_succeeded = 0
+        if state == CircuitState.OPEN:
+            self._opened_at = time.monotonic()
+        if state == CircuitState.CLOSED:
+            self._calls.clear()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state.value,
+            "retry_after": round(self.retry_after(), 2) if self.state == CircuitState.OPEN else 0,
+            "window_calls": len(self._calls),
+            "rejected": self.rejected,
+            "transitions": dict(self.transitions)
+        }
+
+
+# Shared breaker for the TMDB upstream
+tmdb_breaker = CircuitBreaker(
+    window_seconds=TMDB_BREAKER_WINDOW_SECONDS,
+    min_calls=TMDB_BREAKER_MIN_CALLS,
+    failure_rate=TMDB_BREAKER_FAILURE_RATE,
+    slow_call_seconds=TMDB_BREAKER_SLOW_CALL_SECONDS,
+    slow_call_rate=TMDB_BREAKER_SLOW_CALL_RATE,
+    open_seconds=TMDB_BREAKER_OPEN_SECONDS,
+    half_open_probes=TMDB_BREAKER_HALF_OPEN_PROBES
+)
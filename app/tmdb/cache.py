@@ -0,0 +1,199 @@
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from app.config import TMDB_CACHE_MAX_BYTES
+
+
+@dataclass(frozen=True)
+class UpstreamRequest:
+    """Everything needed to fetch a cached resource from TMDB again"""
+    path: str
+    params: Optional[dict] = None
+    headers: Optional[dict] = None
+
+
+@dataclass
+class CacheEntry:
+    # Raw response body for TMDB payloads
+    value: Any
+    size: int
+    expires_at: float
+    # Expired entries may still be served until this point (stale-while-revalidate)
+    stale_until: float
+    request: Optional[UpstreamRequest] = None
+    hits: int = 0
+    # Changes every time the key is stored, for values derived from this one
+    generation: int = 0
+    # Upstream validators, used to revalidate the entry once it expires
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def fresh(self) -> bool:
+        return self.expires_at > time.monotonic()
+
+    @property
+    def age_past_expiry(self) -> float:
+        return max(0.0, time.monotonic() - self.expires_at)
+
+
+def _normalize_param(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def make_cache_key(path: str, params: Optional[dict] = None) -> str:
+    """Build a cache key from an upstream path and its query parameters.
+
+    Parameters are sorted and stringified the same way httpx sends them, so
+    `{"page": 1, "language": "en-US"}` and `{"language": "en-US", "page": "1"}`
+    share one entry. Parameters set to None are not sent and are ignored.
+    """
+    items = sorted(
+        (key, _normalize_param(value))
+        for key, value in (params or {}).items()
+        if value is not None
+    )
+    if not items:
+        return path
+    return f"{path}?{urlencode(items)}"
+
+
+class ResponseCache:
+    """In-process TTL cache with LRU eviction bounded by total payload size"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.fallback_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._generations = itertools.count(1)
+
+    def lookup(self, key: str) -> Optional[CacheEntry]:
+        """Get an entry that is fresh or still within its stale window.
+
+        Callers check `entry.fresh` to decide whether a refresh is due.
+        Entries past their stale window count as misses but are kept as the
+        last known good payload until they are replaced or evicted.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        now = time.monotonic()
+        if entry.stale_until <= now:
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        entry.hits += 1
+        if entry.expires_at <= now:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def set(self, key: str, value: Any, ttl: float, size: int, max_stale: float = 0,
+            request: Optional[UpstreamRequest] = None, etag: Optional[str] = None,
+            last_modified: Optional[str] = None):
+        """Store a value for `ttl` seconds, evicting least recently used entries.
+
+        The value may be served stale for up to `max_stale` seconds after it
+        expires while it is being refreshed.
+        """
+        if size > self.max_bytes:
+            return
+        hits = 0
+        if key in self._entries:
+            # Keep the popularity of refreshed entries
+            hits = self._entries[key].hits
+            self._remove(key)
+        expires_at = time.monotonic() + ttl
+        self._entries[key] = CacheEntry(
+            value=value,
+            size=size,
+            expires_at=expires_at,
+            stale_until=expires_at + max_stale,
+            request=request,
+            hits=hits,
+            generation=next(self._generations),
+            etag=etag,
+            last_modified=last_modified
+        )
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def extend(self, key: str, ttl: float, max_stale: float = 0) -> Optional[CacheEntry]:
+        """Make an entry fresh for another `ttl` seconds, keeping its value"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        entry.expires_at = time.monotonic() + ttl
+        entry.stale_until = entry.expires_at + max_stale
+        return entry
+
+    def last_known(self, key: str) -> Optional[CacheEntry]:
+        """Get an entry regardless of its age, as a fallback during outages"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.fallback_hits += 1
+        return entry
+
+    def peek(self, key: str) -> Optional[CacheEntry]:
+        """Get an entry without counting a lookup or touching its recency"""
+        return self._entries.get(key)
+
+    def hottest(self, n: int) -> List[Tuple[str, CacheEntry]]:
+        """Get the `n` most requested entries"""
+        return heapq.nlargest(
+            n, self._entries.items(), key=lambda item: item[1].hits)
+
+    def decay_hits(self):
+        """Halve request counts so popularity reflects recent traffic"""
+        for entry in self._entries.values():
+            entry.hits //= 2
+
+    def delete(self, key: str):
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "fallback_hits": self.fallback_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+
+# Shared cache for TMDB responses
+response_cache = ResponseCache(TMDB_CACHE_MAX_BYTES)
@@ -0,0 +1,73 @@
+import importlib.util
+import logging
+from typing import Optional
+
+import httpx
+
+from app.config import (
+    TMDB_BASE_URL,
+    TMDB_HEADERS,
+    TMDB_HTTP2,
+    TMDB_KEEPALIVE_EXPIRY,
+    TMDB_MAX_CONNECTIONS,
+    TMDB_MAX_KEEPALIVE_CONNECTIONS,
+)
+
+logger = logging.getLogger("corsair_stream.tmdb")
+
+# Shared client, created on startup and closed on shutdown (see main.py)
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_enabled() -> bool:
+    """HTTP/2 needs the optional `h2` package, fall back to HTTP/1.1 without it"""
+    return TMDB_HTTP2 and importlib.util.find_spec("h2") is not None
+
+
+def _create_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=TMDB_MAX_CONNECTIONS,
+        max_keepalive_connections=TMDB_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=TMDB_KEEPALIVE_EXPIRY
+    )
+    return httpx.AsyncClient(
+        base_url=TMDB_BASE_URL,
+        headers=TMDB_HEADERS,
+        http2=_http2_enabled(),
+        limits=limits
+    )
+
+
+async def start_tmdb_client() -> httpx.AsyncClient:
+    """Create the shared TMDB client"""
+    global _client
+    if _client is None:
+        _client = _create_client()
+        logger.info(
+            f"TMDB client started (http2={_http2_enabled()}, "
+            f"max_connections={TMDB_MAX_CONNECTIONS})")
+    return _client
+
+
+async def close_tmdb_client():
+    """Close the shared TMDB client and its pooled connections"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("TMDB client closed")
+
+
+def get_tmdb_client() -> httpx.AsyncClient:
+    """Get the shared TMDB client.
+
+    The client is normally created by the application lifespan; it is created
+    lazily here so that scripts and tests can use it without starting the app.
+
+    Returns:
+        httpx.AsyncClient: The pooled client used for every TMDB request
+    """
+    global _client
+    if _client is None:
+        _client = _create_client()
+    return _client
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Any, Optional, Set
+
+import orjson
+
+from app.deadline import DeadlineExceeded, current_deadline
+from app.tmdb.breaker import CircuitOpen, tmdb_breaker
+from app.tmdb.cache import CacheEntry, UpstreamRequest, make_cache_key, response_cache
+from app.tmdb.governor import Priority, governed_get
+from app.tmdb.policy import get_cache_policy
+from app.tmdb.singleflight import tmdb_flights
+
+logger = logging.getLogger("corsair_stream.tmdb")
+
+# Background refresh tasks, referenced here so they are not garbage collected
+_refresh_tasks: Set[asyncio.Task] = set()
+refresh_stats = {"started": 0, "failed": 0}
+# Conditional requests for expired entries, and 304s that avoided a download
+revalidation_stats = {"requests": 0, "not_modified": 0, "bytes_saved": 0}
+
+# Set per request by the middleware in main.py. Records the age of the oldest
+# payload served from the last known good cache because TMDB was unavailable
+# or out of budget, so the response can be marked as stale.
+stale_marker: ContextVar[Optional[dict]] = ContextVar("tmdb_stale_marker", default=None)
+
+
+async def fetch_raw(path: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+                    priority: Priority = Priority.INTERACTIVE) -> bytes:
+    """Get a TMDB resource as its raw JSON body, served from cache when possible.
+
+    Concurrent misses for the same key share a single upstream request. An
+    expired entry still within its policy's stale window is returned at once
+    while a single background task refreshes it. While the circuit breaker is
+    open, or the request deadline runs out, the last known good payload is
+    served regardless of its age.
+
+    Args:
+        path: Upstream path relative to TMDB_BASE_URL, e.g. "/movie/550"
+        params: Query parameters sent to TMDB
+        headers: Extra request headers, not part of the cache key
+        priority: Admission priority if the request has to go to TMDB
+
+    Returns:
+        The response body exactly as TMDB sent it
+
+    Raises:
+        httpx.HTTPError: If the upstream request fails or returns an error status
+        UpstreamThrottled: If TMDB keeps answering with 429
+        CircuitOpen: If TMDB is unavailable and nothing is cached
+        DeadlineExceeded: If the request deadline runs out and nothing is cached
+    """
+    key = make_cache_key(path, params)
+    request = UpstreamRequest(path=path, params=params, headers=headers)
+
+    entry = response_cache.lookup(key)
+    if entry is not None:
+        if not entry.fresh:
+            refresh_in_background(key, request)
+        return entry.value
+
+    try:
+        flight = tmdb_flights.do(key, lambda: _shared_fetch(key, request, priority))
+        deadline = current_deadline.get()
+        if deadline is None:
+            return await flight
+        try:
+            # Do not wait past our own budget on a request someone else started
+            return await asyncio.wait_for(flight, deadline.remaining())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded()
+    except (CircuitOpen, DeadlineExceeded):
+        entry = response_cache.last_known(key)
+        if entry is None:
+            raise
+        _mark_stale(entry)
+        return entry.value
+
+
+async def fetch_json(path: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+                     priority: Priority = Priority.INTERACTIVE) -> Any:
+    """Get a TMDB resource decoded from JSON, see fetch_raw"""
+    return orjson.loads(await fetch_raw(path, params, headers, priority))
+
+
+def peek_raw(path: str, params: Optional[dict] = None) -> Optional[bytes]:
+    """Get a TMDB resource only if it is cached, without calling TMDB.
+
+    Stale entries are returned and refreshed in the same way as fetch_raw.
+    """
+    key = make_cache_key(path, params)
+    entry = response_cache.lookup(key)
+    if entry is None:
+        if not tmdb_breaker.is_open():
+            return None
+        entry = response_cache.last_known(key)
+        if entry is None:
+            return None
+        _mark_stale(entry)
+        return entry.value
+    if not entry.fresh and entry.request is not None:
+        refresh_in_background(key, entry.request)
+    return entry.value
+
+
+def peek_json(path: str, params: Optional[dict] = None) -> Optional[Any]:
+    """Get a cached TMDB resource decoded from JSON, see peek_raw"""
+    body = peek_raw(path, params)
+    return orjson.loads(body) if body is not None else None
+
+
+def _mark_stale(entry: CacheEntry):
+    marker = stale_marker.get()
+    if marker is not None:
+        marker["age"] = max(marker.get("age", 0), entry.age_past_expiry)
+
+
+def refresh_in_background(key: str, request: UpstreamRequest) -> bool:
+    """Refresh a cache entry without making the caller wait for it.
+
+    Returns:
+        bool: Whether a refresh was started, False if one is already in
+        flight or the circuit breaker is open
+    """
+    if tmdb_flights.in_flight(key) or tmdb_breaker.is_open():
+        return False
+    refresh_stats["started"] += 1
+    task = asyncio.ensure_future(_refresh(key, request))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+    return True
+
+
+async def _refresh(key: str, request: UpstreamRequest):
+    # Not bound by the deadline of the request that triggered the refresh
+    current_deadline.set(None)
+    try:
+        await tmdb_flights.do(
+            key, lambda: _fetch_upstream(key, request, Priority.BACKGROUND))
+    except Exception as e:
+        refresh_stats["failed"] += 1
+        logger.warning(f"Background refresh of {key} failed: {str(e)}")
+
+
+async def _shared_fetch(key: str, request: UpstreamRequest, priority: Priority) -> bytes:
+    # The flight serves every request that joins it, so it is not bound by the
+    # deadline of the one that started it. Each waits up to its own in fetch_raw.
+    current_deadline.set(None)
+    return await _fetch_upstream(key, request, priority)
+
+
+async def _fetch_upstream(key: str, request: UpstreamRequest, priority: Priority) -> bytes:
+    """Request a resource from TMDB and store its body in the response cache.
+
+    An entry already in the cache is revalidated with its ETag or
+    Last-Modified; if TMDB answers 304 it is kept for another TTL without
+    downloading the body again.
+    """
+    headers = request.headers
+    cached = response_cache.peek(key)
+    validators = _conditional_headers(cached)
+    if validators:
+        headers = {**(headers or {}), **validators}
+        revalidation_stats["requests"] += 1
+
+    response = await governed_get(
+        request.path, params=request.params, headers=headers, priority=priority)
+    policy = get_cache_policy(request.path)
+
+    if validators and response.status_code == 304:
+        revalidation_stats["not_modified"] += 1
+        revalidation_stats["bytes_saved"] += cached.size
+        if response_cache.extend(key, policy.ttl, policy.max_stale) is None:
+            # Evicted while we were revalidating it
+            _store(key, request, cached.value, cached.etag, cached.last_modified)
+        return cached.value
+
+    response.raise_for_status()
+    body = response.content
+    _store(key, request, body, response.headers.get("ETag"),
+           response.headers.get("Last-Modified"))
+    return body
+
+
+def get_revalidation_stats() -> dict:
+    requests = revalidation_stats["requests"]
+    return {
+        **revalidation_stats,
+        "hit_ratio": round(revalidation_stats["not_modified"] / requests, 4) if requests else 0.0
+    }
+
+
+def _conditional_headers(entry: Optional[CacheEntry]) -> dict:
+    if entry is None:
+        return {}
+    headers = {}
+    if entry.etag:
+        headers["If-None-Match"] = entry.etag
+    if entry.last_modified:
+        headers["If-Modified-Since"] = entry.last_modified
+    return headers
+
+
+def _store(key: str, request: UpstreamRequest, body: bytes, etag: Optional[str],
+           last_modified: Optional[str]):
+    policy = get_cache_policy(request.path)
+    response_cache.set(
+        key,
+        body,
+        ttl=policy.ttl,
+        size=len(body),
+        max_stale=policy.max_stale,
+        request=request,
+        etag=etag,
+        last_modified=last_modified
+    )
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+import orjson
+from fastapi import HTTPException
+
+from app.config import TMDB_GENRE_LANGUAGES, TMDB_GENRE_REFRESH_INTERVAL
+from app.tmdb.governor import Priority, governed_get
+
+logger = logging.getLogger("corsair_stream.tmdb")
+
+
+class UnsupportedLanguage(HTTPException):
+    """The genre list was asked for in a language outside TMDB_GENRE_LANGUAGES"""
+
+    def __init__(self, languages: List[str]):
+        super().__init__(
+            status_code=400,
+            detail=f"Unsupported language, use one of: {', '.join(languages)}"
+        )
+
+
+class GenreIndex:
+    """In-memory TMDB movie genre table per language.
+
+    Loaded on startup and refreshed on a long interval, so genre lookups never
+    call TMDB on the request path.
+    """
+
+    def __init__(self, languages: List[str]):
+        self.languages = languages
+        self._genres: Dict[str, List[dict]] = {}
+        self._names_by_id: Dict[str, Dict[int, str]] = {}
+        self._ids_by_name: Dict[str, Dict[str, int]] = {}
+        self._genres_body: Dict[str, bytes] = {}
+        self._name_to_id_body: Dict[str, bytes] = {}
+
+    async def load(self, language: str, priority: Priority = Priority.BACKGROUND):
+        """Fetch the genre list for one language and swap it into the index"""
+        response = await governed_get(
+            "/genre/movie/list", params={"language": language}, priority=priority)
+        response.raise_for_status()
+        genres = orjson.loads(response.content).get("genres", [])
+        name_to_id = {genre["name"].lower(): genre["id"] for genre in genres}
+
+        self._genres[language] = genres
+        self._names_by_id[language] = {
+            genre["id"]: genre["name"] for genre in genres}
+        self._ids_by_name[language] = name_to_id
+        # Pre-encoded response bodies for the genre endpoints
+        self._genres_body[language] = orjson.dumps({"genres": genres})
+        self._name_to_id_body[language] = orjson.dumps(name_to_id)
+
+    async def load_all(self):
+        """Load every configured language.
+
+        A language that fails to load keeps its previous table.
+        """
+        for language in self.languages:
+            try:
+                await self.load(language)
+            except Exception as e:
+                logger.warning(
+                    f"Could not load TMDB genres for {language}: {str(e)}")
+
+    async def ensure_loaded(self, language: str):
+        """Load a language on first use if it failed to preload.
+
+        Raises:
+            UnsupportedLanguage: If the language is not in TMDB_GENRE_LANGUAGES,
+                so clients cannot grow the index
+        """
+        if language not in self.languages:
+            raise UnsupportedLanguage(self.languages)
+        if language not in self._genres:
+            await self.load(language, Priority.INTERACTIVE)
+
+    def loaded(self, language: str) -> bool:
+        return language in self._genres
+
+    def genres(self, language: str = "en-US") -> List[dict]:
+        """Get the genre list in the shape of TMDB's /genre/movie/list"""
+        return self._genres.get(language, [])
+
+    def name_to_id(self, language: str = "en-US") -> Dict[str, int]:
+        """Get the mapping of lowercase genre names to ids"""
+        return self._ids_by_name.get(language, {})
+
+    def genres_body(self, language: str = "en-US") -> bytes:
+        """Get the genre list encoded as JSON"""
+        return self._genres_body.get(language, b'{"genres":[]}')
+
+    def name_to_id_body(self, language: str = "en-US") -> bytes:
+        """Get the name to id mapping encoded as JSON"""
+        return self._name_to_id_body.get(language, b"{}")
+
+    def get_name(self, genre_id: int, language: str = "en-US") -> Optional[str]:
+        return self._names_by_id.get(language, {}).get(genre_id)
+
+    def get_id(self, name: str, language: str = "en-US") -> Optional[int]:
+        return self._ids_by_name.get(language, {}).get(name.lower())
+
+    def resolve_names(self, genre_ids: List[int], language: str = "en-US") -> List[str]:
+        """Translate genre ids to names, skipping unknown ids"""
+        names_by_id = self._names_by_id.get(language, {})
+        return [names_by_id[genre_id] for genre_id in genre_ids if genre_id in names_by_id]
+
+
+async def run_genre_refresher():
+    """Reload the genre index periodically, runs for the lifetime of the app"""
+    while True:
+        await asyncio.sleep(TMDB_GENRE_REFRESH_INTERVAL)
+        await genre_index.load_all()
+
+
+# Shared genre index
+genre_index = GenreIndex(TMDB_GENRE_LANGUAGES)
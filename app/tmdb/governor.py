@@ -0,0 +1,316 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from enum import IntEnum
+from typing import List, Optional
+
+import httpx
+from fastapi import HTTPException
+
+from app.config import (
+    TMDB_INITIAL_CONCURRENCY,
+    TMDB_LATENCY_TARGET,
+    TMDB_MAX_CONCURRENCY,
+    TMDB_MAX_RETRIES,
+    TMDB_MAX_RETRY_WAIT,
+    TMDB_MIN_CONCURRENCY,
+    TMDB_RATE_BURST,
+    TMDB_RATE_LIMIT,
+    UPSTREAM_CONNECT_TIMEOUT,
+    UPSTREAM_DEFAULT_TIMEOUT,
+)
+from app.deadline import DeadlineExceeded, current_deadline
+from app.tmdb.breaker import tmdb_breaker
+from app.tmdb.client import get_tmdb_client
+
+logger = logging.getLogger("corsair_stream.tmdb")
+
+
+class Priority(IntEnum):
+    # Lower values are served first
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class UpstreamThrottled(HTTPException):
+    """TMDB kept rejecting requests with 429, ask the client to retry later"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail="Movie service is busy, please retry shortly",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.5)))}
+        )
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either in seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class UpstreamGovernor:
+    """Admission control for TMDB requests.
+
+    Requests need a token from a token bucket refilled at `rate` per second
+    and a slot under an adaptive concurrency limit. The limit grows by one
+    per round of successful calls below `latency_target` and is cut on slow
+    calls and halved on 429s (AIMD). While TMDB asks us to back off
+    (Retry-After) no request is started. Waiting requests are admitted by
+    priority, then in arrival order.
+    """
+
+    def __init__(self, rate: float, burst: int, min_limit: int, max_limit: int,
+                 initial_limit: int, latency_target: float):
+        self.rate = rate
+        self.burst = burst
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self._limit = float(initial_limit)
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._in_flight = 0
+        self._waiters: List[list] = []
+        self._sequence = itertools.count()
+        self._wake_handle: Optional[asyncio.TimerHandle] = None
+        self.admitted = 0
+        self.queued = 0
+        self.throttled = 0
+        self.slow = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE):
+        """Wait until a request of this priority may be sent"""
+        if not self._waiters and self._try_start():
+            return
+        self.queued += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._sequence), future])
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just before being cancelled, give the slot back
+                self._in_flight -= 1
+                self._wake()
+            raise
+
+    def release(self, latency: Optional[float], throttled: bool = False):
+        """Return a slot and adapt the concurrency limit.
+
+        Args:
+            latency: Duration of the call, None if it failed without a response
+            throttled: Whether TMDB answered with 429
+        """
+        self._in_flight -= 1
+        if throttled:
+            self.throttled += 1
+            self._limit = max(self.min_limit, self._limit / 2)
+        elif latency is not None and latency > self.latency_target:
+            self.slow += 1
+            self._limit = max(self.min_limit, self._limit * 0.9)
+        elif latency is not None:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+        self._wake()
+
+    def pause(self, seconds: float):
+        """Stop starting requests for `seconds`, as asked by Retry-After"""
+        self._blocked_until = max(
+            self._blocked_until, time.monotonic() + seconds)
+
+    def paused_for(self) -> float:
+        """Seconds left before TMDB allows requests again"""
+        return max(0.0, self._blocked_until - time.monotonic())
+
+    def _refill(self, now: float):
+        elapsed = now - self._refilled_at
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._refilled_at = now
+
+    def _try_start(self) -> bool:
+        now = time.monotonic()
+        if now < self._blocked_until or self._in_flight >= self.limit:
+            return False
+        self._refill(now)
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        self._in_flight += 1
+        self.admitted += 1
+        return True
+
+    def _wake(self):
+        """Admit waiters in priority order while there is capacity"""
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                # Cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            if not self._try_start():
+                break
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+
+        if self._waiters and self._wake_handle is None:
+            delay = self._next_capacity_in()
+            if delay > 0:
+                self._wake_handle = asyncio.get_running_loop().call_later(
+                    delay, self._on_timer)
+
+    def _next_capacity_in(self) -> float:
+        """Seconds until a blocked or token-starved queue can move again.
+
+        Returns 0 when only the concurrency limit is in the way, in which
+        case the next release wakes the queue.
+        """
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        return 0
+
+    def _on_timer(self):
+        self._wake_handle = None
+        self._wake()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency_limit": self.limit,
+            "in_flight": self._in_flight,
+            "waiting": sum(1 for waiter in self._waiters if not waiter[2].done()),
+            "tokens": round(self._tokens, 2),
+            "paused_for": round(self.paused_for(), 2),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "throttled": self.throttled,
+            "slow": self.slow
+        }
+
+
+async def governed_get(path: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+                       priority: Priority = Priority.INTERACTIVE) -> httpx.Response:
+    """GET a TMDB resource under the circuit breaker and the governor.
+
+    429 responses are retried after their Retry-After.
+
+    Raises:
+        DeadlineExceeded: If the request deadline runs out
+        CircuitOpen: If the circuit breaker rejects the call
+        UpstreamThrottled: If TMDB still throttles after the allowed retries,
+            or asks us to wait longer than TMDB_MAX_RETRY_WAIT
+        httpx.HTTPError: If the request fails
+    """
+    for attempt in range(TMDB_MAX_RETRIES + 1):
+        # Fail fast instead of queueing behind a long Retry-After
+        paused_for = tmdb_governor.paused_for()
+        if paused_for > TMDB_MAX_RETRY_WAIT:
+            raise UpstreamThrottled(paused_for)
+
+        response = await _send(path, params, headers, priority)
+        if response.status_code != 429:
+            return response
+
+        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+        if retry_after is None:
+            retry_after = 0.5 * 2 ** attempt
+        tmdb_governor.pause(retry_after)
+        logger.warning(
+            f"TMDB throttled {path}, backing off for {retry_after:.1f}s")
+        if attempt == TMDB_MAX_RETRIES or retry_after > TMDB_MAX_RETRY_WAIT:
+            raise UpstreamThrottled(retry_after)
+        deadline = current_deadline.get()
+        if deadline is not None and retry_after >= deadline.remaining():
+            raise UpstreamThrottled(retry_after)
+
+
+async def _send(path: str, params: Optional[dict], headers: Optional[dict],
+                priority: Priority) -> httpx.Response:
+    """Send a single request, reporting its outcome to the breaker and governor.
+
+    Queueing and the call itself are bounded by the current request deadline.
+    """
+    deadline = current_deadline.get()
+    if deadline is not None:
+        deadline.check()
+    tmdb_breaker.check()
+    try:
+        if deadline is not None:
+            await asyncio.wait_for(tmdb_governor.acquire(priority), deadline.remaining())
+        else:
+            await tmdb_governor.acquire(priority)
+    except asyncio.TimeoutError:
+        tmdb_breaker.abandon()
+        raise DeadlineExceeded()
+    except BaseException:
+        tmdb_breaker.abandon()
+        raise
+
+    if deadline is not None:
+        timeout = deadline.httpx_timeout()
+    else:
+        timeout = httpx.Timeout(
+            UPSTREAM_DEFAULT_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT)
+
+    start = time.monotonic()
+    response = None
+    failed = False
+    try:
+        response = await get_tmdb_client().get(
+            path, params=params, headers=headers, timeout=timeout)
+        return response
+    except httpx.TimeoutException:
+        if deadline is not None and deadline.expired:
+            # Cut short by our own budget, not necessarily a TMDB failure
+            raise DeadlineExceeded()
+        failed = True
+        raise
+    except httpx.HTTPError:
+        failed = True
+        raise
+    finally:
+        latency = time.monotonic() - start
+        if response is not None:
+            throttled = response.status_code == 429
+            tmdb_governor.release(latency, throttled)
+            tmdb_breaker.record(response.status_code >= 500 or throttled, latency)
+        else:
+            tmdb_governor.release(None)
+            if failed:
+                tmdb_breaker.record(True, latency)
+            elif deadline is not None and deadline.expired:
+                tmdb_breaker.record(False, latency)
+            else:
+                # Cancelled
+                tmdb_breaker.abandon()
+
+
+# Shared governor for all TMDB traffic
+tmdb_governor = UpstreamGovernor(
+    rate=TMDB_RATE_LIMIT,
+    burst=TMDB_RATE_BURST,
+    min_limit=TMDB_MIN_CONCURRENCY,
+    max_limit=TMDB_MAX_CONCURRENCY,
+    initial_limit=TMDB_INITIAL_CONCURRENCY,
+    latency_target=TMDB_LATENCY_TARGET
+)
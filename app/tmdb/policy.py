@@ -0,0 +1,38 @@
+import re
+from dataclasses import dataclass
+from typing import List, Tuple
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    ttl: float
+    # How long an expired entry may be served while it is refreshed in the
+    # background. Past this hard limit the request waits for TMDB.
+    max_stale: float = 0
+
+
+# Caching policy per upstream endpoint, first match wins
+CACHE_POLICIES: List[Tuple[re.Pattern, CachePolicy]] = [
+    (re.compile(r"^/genre/movie/list$"), CachePolicy(ttl=7 * DAY, max_stale=7 * DAY)),
+    (re.compile(r"^/watch/providers/movie$"), CachePolicy(ttl=DAY, max_stale=DAY)),
+    (re.compile(r"^/movie/now_playing$"), CachePolicy(ttl=10 * MINUTE, max_stale=HOUR)),
+    (re.compile(r"^/movie/[a-z_]+$"), CachePolicy(ttl=30 * MINUTE, max_stale=2 * HOUR)),
+    (re.compile(r"^/movie/\d+/watch/providers$"), CachePolicy(ttl=6 * HOUR, max_stale=6 * HOUR)),
+    (re.compile(r"^/movie/\d+(/[a-z]+)?$"), CachePolicy(ttl=6 * HOUR, max_stale=DAY)),
+    (re.compile(r"^/discover/movie$"), CachePolicy(ttl=30 * MINUTE, max_stale=2 * HOUR)),
+    (re.compile(r"^/search/movie$"), CachePolicy(ttl=10 * MINUTE)),
+]
+
+DEFAULT_POLICY = CachePolicy(ttl=5 * MINUTE)
+
+
+def get_cache_policy(path: str) -> CachePolicy:
+    """Get the caching policy for an upstream TMDB path"""
+    for pattern, policy in CACHE_POLICIES:
+        if pattern.match(path):
+            return policy
+    return DEFAULT_POLICY
@@ -0,0 +1,153 @@
+import re
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Optional, Union
+
+import orjson
+
+from app.config import TMDB_PROJECTION_CACHE_MAX_BYTES, TMDB_PROJECTION_SPEC_CACHE_SIZE
+from app.tmdb.cache import ResponseCache, response_cache
+
+# One path segment: a key, optionally followed by an index `[2]` or a slice `[:10]`
+_SEGMENT = re.compile(r"^([A-Za-z0-9_]+)(?:\[(-?\d*)(:)?(-?\d*)\])?$")
+
+
+class InvalidFieldSpec(ValueError):
+    """A ?fields= value that cannot be compiled"""
+
+
+@dataclass
+class _Field:
+    selector: Optional[Union[int, slice]] = None
+    # None selects the whole value
+    children: Optional[Dict[str, "_Field"]] = None
+
+
+class Projection:
+    """A compiled field spec such as `title,credits.cast[:10].name`.
+
+    Paths are dotted keys. A key may select a single list item (`[0]`) or a
+    slice (`[:10]`); the rest of the path applies to every selected item.
+    Keys missing from the payload are left out.
+    """
+
+    def __init__(self, spec: str, fields: Dict[str, _Field]):
+        # Normalized spec, identical for equivalent field lists
+        self.spec = spec
+        self.fields = fields
+
+    def apply(self, value: Any) -> Any:
+        return _project(self.fields, value)
+
+
+def _project(fields: Dict[str, _Field], value: Any) -> Any:
+    if isinstance(value, list):
+        return [_project(fields, item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    projected = {}
+    for key, field in fields.items():
+        if key not in value:
+            continue
+        item = value[key]
+        if field.selector is not None and isinstance(item, list):
+            if isinstance(field.selector, slice):
+                item = item[field.selector]
+            elif -len(item) <= field.selector < len(item):
+                item = item[field.selector]
+            else:
+                continue
+        if field.children is not None:
+            item = _project(field.children, item)
+        projected[key] = item
+    return projected
+
+
+def _parse_segment(segment: str):
+    match = _SEGMENT.match(segment)
+    if match is None:
+        raise InvalidFieldSpec(f"Invalid field '{segment}'")
+    key, start, is_slice, stop = match.groups()
+    if is_slice:
+        return key, slice(int(start) if start else None, int(stop) if stop else None)
+    if start:
+        return key, int(start)
+    if "[" in segment:
+        raise InvalidFieldSpec(f"Invalid field '{segment}'")
+    return key, None
+
+
+def _merge(fields: Dict[str, _Field], segments: list):
+    key, selector = segments[0]
+    rest = segments[1:]
+    field = fields.get(key)
+    if field is None:
+        field = fields[key] = _Field(selector, {} if rest else None)
+    elif field.selector != selector:
+        raise InvalidFieldSpec(f"Conflicting selectors for '{key}'")
+    elif not rest:
+        # The whole value was asked for, it covers any narrower path
+        field.children = None
+    if rest and field.children is not None:
+        _merge(field.children, rest)
+
+
+@lru_cache(maxsize=TMDB_PROJECTION_SPEC_CACHE_SIZE)
+def compile_projection(spec: str) -> Projection:
+    """Compile a comma-separated list of field paths.
+
+    Raises:
+        InvalidFieldSpec: If a path is malformed or paths select a key differently
+    """
+    paths = sorted({path.strip() for path in spec.split(",") if path.strip()})
+    if not paths:
+        raise InvalidFieldSpec("No fields given")
+    fields: Dict[str, _Field] = {}
+    for path in paths:
+        _merge(fields, [_parse_segment(segment) for segment in path.split(".")])
+    return Projection(",".join(paths), fields)
+
+
+class ProjectionStore:
+    """Projected payloads cached apart from the full bodies they come from.
+
+    A projected body is keyed by the source cache key and the normalized
+    field spec, and is only reused while the source entry it was computed
+    from is still the one in the source cache.
+    """
+
+    def __init__(self, source: ResponseCache, max_bytes: int):
+        self.source = source
+        self.cache = ResponseCache(max_bytes)
+
+    def project(self, key: str, body: bytes, projection: Projection) -> bytes:
+        """Get the JSON body of `projection` applied to a cached TMDB body"""
+        source = self.source.peek(key)
+        if source is None or source.value is not body:
+            # Not the cached payload (e.g. too large to cache), nothing to key on
+            return orjson.dumps(projection.apply(orjson.loads(body)))
+
+        projected_key = f"{key}#fields={projection.spec}"
+        entry = self.cache.lookup(projected_key)
+        if entry is not None and entry.value[0] == source.generation:
+            return entry.value[1]
+
+        projected = orjson.dumps(projection.apply(orjson.loads(body)))
+        self.cache.set(
+            projected_key,
+            (source.generation, projected),
+            ttl=max(0.0, source.stale_until - time.monotonic()),
+            size=len(projected)
+        )
+        return projected
+
+    def stats(self) -> dict:
+        return {
+            **self.cache.stats(),
+            "compiled_specs": compile_projection.cache_info().currsize
+        }
+
+
+# Shared store for ?fields= projections of TMDB responses
+tmdb_projections = ProjectionStore(response_cache, TMDB_PROJECTION_CACHE_MAX_BYTES)
@@ -0,0 +1,41 @@
+import asyncio
+import logging
+import time
+
+from app.config import TMDB_REFRESH_AHEAD, TMDB_REFRESH_INTERVAL, TMDB_REFRESH_TOP_N
+from app.tmdb.cache import response_cache
+from app.tmdb.fetch import refresh_in_background
+
+logger = logging.getLogger("corsair_stream.tmdb")
+
+
+def refresh_hot_entries() -> int:
+    """Refresh the most requested cache entries that are about to expire.
+
+    Returns:
+        int: Number of refreshes started
+    """
+    refresh_before = time.monotonic() + TMDB_REFRESH_AHEAD
+    started = 0
+    for key, entry in response_cache.hottest(TMDB_REFRESH_TOP_N):
+        if entry.hits == 0 or entry.request is None:
+            continue
+        if entry.expires_at <= refresh_before and refresh_in_background(key, entry.request):
+            started += 1
+    response_cache.decay_hits()
+    return started
+
+
+async def run_refresh_scheduler():
+    """Periodically refresh hot entries, runs for the lifetime of the app"""
+    logger.info(
+        f"TMDB refresh scheduler started (top {TMDB_REFRESH_TOP_N} keys "
+        f"every {TMDB_REFRESH_INTERVAL}s)")
+    while True:
+        await asyncio.sleep(TMDB_REFRESH_INTERVAL)
+        try:
+            started = refresh_hot_entries()
+            if started:
+                logger.debug(f"Refreshing {started} hot TMDB cache entries")
+        except Exception as e:
+            logger.exception(f"TMDB refresh scheduler error: {str(e)}")
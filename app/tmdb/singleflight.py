@@ -0,0 +1,49 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one upstream call.
+
+    The first caller for a key starts the call as a task; every caller that
+    arrives while it is in flight awaits the same task and receives the same
+    result or exception. The task is shielded, so a cancelled caller (e.g. a
+    client that disconnected) does not cancel the call for the others.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.collapsed = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.collapsed += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._in_flight
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the exception as retrieved in case every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "upstream_calls": self.calls,
+            "collapsed": self.collapsed,
+            "in_flight": len(self._in_flight)
+        }
+
+
+# Shared coalescing layer for TMDB requests
+tmdb_flights = SingleFlight()
@@ -0,0 +1,87 @@
+import re
+from typing import Dict, Iterable, List, Optional
+
+import orjson
+from pydantic import BaseModel
+
+from app.config import TMDB_SUMMARY_CACHE_MAX_BYTES, TMDB_SUMMARY_TTL
+from app.tmdb.aggregate import movie_aggregates
+from app.tmdb.cache import ResponseCache
+from app.tmdb.genres import genre_index
+
+# str.isdigit() also accepts digits like "²" that int() rejects
+_DIGITS = re.compile(r"[0-9]+")
+
+
+class MovieSummary(BaseModel):
+    id: int
+    title: Optional[str] = None
+    poster_path: Optional[str] = None
+    year: Optional[int] = None
+    rating: Optional[float] = None
+    genres: List[str] = []
+
+
+def summarize_movie(details: dict) -> dict:
+    """Build a compact movie summary from a TMDB details payload"""
+    release_date = details.get("release_date") or ""
+    return {
+        "id": details["id"],
+        "title": details.get("title"),
+        "poster_path": details.get("poster_path"),
+        "year": int(release_date[:4]) if _DIGITS.fullmatch(release_date[:4]) else None,
+        "rating": details.get("vote_average"),
+        "genres": _genre_names(details)
+    }
+
+
+def _genre_names(movie: dict) -> List[str]:
+    # Details payloads carry genre objects, list payloads only genre ids
+    if "genres" in movie:
+        return [genre["name"] for genre in movie["genres"]]
+    return genre_index.resolve_names(movie.get("genre_ids", []))
+
+
+class MovieSummaryStore:
+    """Compact movie summaries for hydrating watchlist and history rows"""
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.ttl = ttl
+        self.cache = ResponseCache(max_bytes)
+
+    async def get_many(self, content_ids: Iterable[str]) -> Dict[str, Optional[dict]]:
+        """Get summaries keyed by content id.
+
+        Cached summaries are returned directly and the rest are filled from
+        the movie details aggregates, fetched concurrently. Content ids that
+        are not TMDB movie ids, or whose lookup fails, map to None.
+        """
+        summaries = {}
+        # Movie id -> content ids spelling it, e.g. "550" and "0550"
+        missing: Dict[int, List[str]] = {}
+        for content_id in dict.fromkeys(content_ids):
+            if not _DIGITS.fullmatch(content_id):
+                summaries[content_id] = None
+                continue
+            entry = self.cache.lookup(content_id)
+            if entry is not None:
+                summaries[content_id] = entry.value
+            else:
+                missing.setdefault(int(content_id), []).append(content_id)
+
+        if missing:
+            results = await movie_aggregates.get_many(missing)
+            for movie_id, (body, error) in results.items():
+                summary = None
+                if error is None:
+                    summary = summarize_movie(orjson.loads(body))
+                for content_id in missing[movie_id]:
+                    if summary is not None:
+                        self.cache.set(content_id, summary, ttl=self.ttl,
+                                       size=len(orjson.dumps(summary)))
+                    summaries[content_id] = summary
+        return summaries
+
+
+# Shared store for ?expand=movie
+movie_summaries = MovieSummaryStore(TMDB_SUMMARY_CACHE_MAX_BYTES, TMDB_SUMMARY_TTL)
@@ -7,14 +7,29 @@ import time
 import logging
 from datetime import datetime
 from dotenv import load_dotenv
-from app.database import engine, Base
-from app.config import TMDB_BASE_URL, TMDB_HEADERS
+from app.database import engine, async_engine, Base
+from app.config import DB_USAGE_HEADERS, TMDB_BASE_URL, TMDB_HEADERS
 import json
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
 
 from app.auth.auth import auth_router
 from app.api.watchlist import watchlist_router
 from app.api.watch_history import history_router
+from app.api.playback import playback_router
 from app.api.movies import movies_router
+from app.api.metrics import metrics_router
+from app.tmdb.client import start_tmdb_client, close_tmdb_client
+from app.tmdb.refresh import run_refresh_scheduler
+from app.tmdb.genres import genre_index, run_genre_refresher
+from app.tmdb.fetch import stale_marker
+from app.deadline import Deadline, budget_stats, current_deadline, get_route_budget
+from app.http_cache import conditional_response
+from app.db_usage import start_db_usage
+from app.auth.passwords import password_hasher
+from app.auth.google import start_google_client, close_google_client
+from app.history_buffer import history_buffer
+from app.progress import progress_tracker
 
 # Configure logging
 logging.basicConfig(
@@ -28,7 +43,35 @@ logger = logging.getLogger("corsair_stream")
 
 load_dotenv()
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shutdown steps run in reverse order of registration, each one even if
+    # an earlier one raised
+    async with AsyncExitStack() as shutdown:
+        shutdown.push_async_callback(async_engine.dispose)
+        # Shared pooled client for all TMDB requests
+        await start_tmdb_client()
+        shutdown.push_async_callback(close_tmdb_client)
+        await start_google_client()
+        shutdown.push_async_callback(close_google_client)
+        password_hasher.start()
+        shutdown.callback(password_hasher.shutdown)
+        await genre_index.load_all()
+        refresh_task = asyncio.create_task(run_refresh_scheduler())
+        shutdown.callback(refresh_task.cancel)
+        genre_task = asyncio.create_task(run_genre_refresher())
+        shutdown.callback(genre_task.cancel)
+        # Write buffered watch history and progress before the connection
+        # pool goes away, progress first as it may go through the buffer
+        history_buffer.start()
+        shutdown.push_async_callback(history_buffer.stop)
+        progress_tracker.start()
+        shutdown.push_async_callback(progress_tracker.stop)
+        yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 origins = [
@@ -51,6 +94,53 @@ async def log_requests(request: Request, call_next):
                 process_time:.2f}s - Status {response.status_code}")
     return response
 
+
+@app.middleware("http")
+async def enforce_deadlines(request: Request, call_next):
+    # Give the request a latency budget that upstream calls derive timeouts from
+    deadline = Deadline(get_route_budget(request.url.path))
+    current_deadline.set(deadline)
+    response = await call_next(request)
+    route = request.scope.get("route")
+    budget_stats.record(
+        route.path if route is not None else None,
+        deadline,
+        response.status_code
+    )
+    return response
+
+
+@app.middleware("http")
+async def count_db_usage(request: Request, call_next):
+    # One session is shared per request, these counts let tests assert it
+    usage = start_db_usage()
+    response = await call_next(request)
+    if DB_USAGE_HEADERS:
+        response.headers["X-DB-Connections"] = str(usage["connections"])
+        response.headers["X-DB-Queries"] = str(usage["queries"])
+    return response
+
+
+@app.middleware("http")
+async def mark_stale_responses(request: Request, call_next):
+    # Flag responses served from the last known good TMDB cache during an outage
+    marker = {}
+    stale_marker.set(marker)
+    response = await call_next(request)
+    if marker:
+        response.headers["X-Cache-Stale"] = str(int(marker["age"]))
+    return response
+
+
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    # ETag / If-None-Match, Cache-Control and compression for API reads
+    response = await call_next(request)
+    if (request.method != "GET" or response.status_code != 200
+            or not request.url.path.startswith("/api/")):
+        return response
+    return await conditional_response(request, response)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -70,6 +160,9 @@ app.include_router(
     watchlist_router, prefix="/api/watchlist", tags=["Watchlist"])
 app.include_router(history_router, prefix="/api/history",
                    tags=["Watch History"])
+app.include_router(playback_router, prefix="/api/playback",
+                   tags=["Playback"])
+app.include_router(metrics_router, prefix="/api/metrics", tags=["Metrics"])
 app.include_router(movies_router, prefix="/api", tags=["Movies"])
 
 
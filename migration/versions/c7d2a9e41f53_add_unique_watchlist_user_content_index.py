@@ -0,0 +1,39 @@
+"""add unique watchlist (user_id, content_id) index
+
+Revision ID: c7d2a9e41f53
+Revises: 4ceefd60c6e8
+Create Date: 2026-10-17 09:12:40.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2a9e41f53'
+down_revision: Union[str, None] = '4ceefd60c6e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep the oldest row of any duplicates, the unique index would fail otherwise
+    op.execute(sa.text("""
+        DELETE newer FROM watchlist AS newer
+        JOIN watchlist AS older
+          ON newer.user_id = older.user_id
+         AND newer.content_id = older.content_id
+         AND newer.id > older.id
+    """))
+    op.create_index('uq_watchlist_user_content', 'watchlist',
+                    ['user_id', 'content_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The foreign key on user_id needs an index once the composite one is gone
+    op.create_index('ix_watchlist_user_id', 'watchlist', ['user_id'], unique=False)
+    op.drop_index('uq_watchlist_user_content', table_name='watchlist')
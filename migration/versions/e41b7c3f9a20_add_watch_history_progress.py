@@ -0,0 +1,32 @@
+"""add watch history progress
+
+Revision ID: e41b7c3f9a20
+Revises: c7d2a9e41f53
+Create Date: 2026-10-17 10:03:11.284615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e41b7c3f9a20'
+down_revision: Union[str, None] = 'c7d2a9e41f53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('watch_history', sa.Column(
+        'position', sa.Integer(), nullable=True, server_default='0'))
+    op.add_column('watch_history', sa.Column(
+        'duration', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('watch_history', 'duration')
+    op.drop_column('watch_history', 'position')
@@ -0,0 +1,62 @@
+"""Run the app against a temporary SQLite database instead of MySQL.
+
+The engines are swapped before anything else imports them, so main.py,
+the routes and the DB usage counters all use SQLite.
+"""
+import os
+import tempfile
+import uuid
+
+os.environ.setdefault("CLIENT_ID", "test-client-id")
+os.environ.setdefault("CLIENT_SECRET", "test-client-secret")
+os.environ.setdefault("REDIRECT_URI", "http://localhost:8000/api/auth/oauth2/callback")
+os.environ.setdefault("SECRET", "test-secret")
+os.environ["DB_USAGE_HEADERS"] = "true"
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+
+from app import database, models  # noqa: E402
+
+_path = os.path.join(tempfile.mkdtemp(), "test.db")
+database.engine = create_engine(
+    f"sqlite:///{_path}", connect_args={"check_same_thread": False})
+database.SessionLocal.configure(bind=database.engine)
+# The models are declared on their own Base in app/models.py
+models.Base.metadata.create_all(database.engine)
+database.async_engine = create_async_engine(
+    f"sqlite+aiosqlite:///{_path}", poolclass=database.InstrumentedAsyncPool,
+    pool_size=5, max_overflow=0)
+database.AsyncSessionLocal.configure(bind=database.async_engine)
+
+import main  # noqa: E402
+from app.auth.auth import create_access_token  # noqa: E402
+from app.tmdb.genres import genre_index  # noqa: E402
+
+
+async def _skip_genre_load():
+    pass
+
+
+@pytest.fixture(scope="session")
+def client():
+    # Startup would otherwise fetch the genre index from TMDB
+    genre_index.load_all = _skip_genre_load
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def auth_headers():
+    """Headers of a freshly created user"""
+    db = database.SessionLocal()
+    email = f"{uuid.uuid4().hex}@example.com"
+    user = models.User(username=email, email=email, hashed_password="!oauth-only")
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    db.close()
+    token = create_access_token({"sub": str(user_id)})
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.db_usage import assert_db_usage
+
+
+def test_watchlist_routes_stay_within_budget(client, auth_headers):
+    # The first request also loads the user into the principal cache
+    assert_db_usage(client.get("/api/watchlist/", headers=auth_headers), 1, 2)
+    assert_db_usage(client.get("/api/watchlist/", headers=auth_headers), 1, 1)
+
+    response = client.post("/api/watchlist/", json={"content_id": "550"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert_db_usage(response, 1, 2)
+
+    # Adding the same title again is idempotent and as cheap
+    again = client.post("/api/watchlist/", json={"content_id": "550"}, headers=auth_headers)
+    assert again.json()["id"] == response.json()["id"]
+    assert_db_usage(again, 1, 2)
+
+    response = client.delete("/api/watchlist/550/", headers=auth_headers)
+    assert response.status_code == 200
+    assert_db_usage(response, 1, 1)
+
+
+def test_history_routes_stay_within_budget(client, auth_headers):
+    assert_db_usage(client.get("/api/history/", headers=auth_headers), 1, 2)
+
+    response = client.post(
+        "/api/history/", json={"content_id": "550", "completed": True}, headers=auth_headers)
+    assert response.status_code == 200
+    assert_db_usage(response, 1, 1)
+
+    response = client.get("/api/history/", headers=auth_headers)
+    assert [entry["content_id"] for entry in response.json()] == ["550"]
+    assert_db_usage(response, 1, 1)
+
+    response = client.get("/api/history/550", headers=auth_headers)
+    assert response.json()["completed"] is True
+    assert_db_usage(response, 1, 1)
+
+    response = client.delete("/api/history/550", headers=auth_headers)
+    assert response.status_code == 200
+    assert_db_usage(response, 1, 2)
+
+
+def test_progress_heartbeats_are_coalesced(client, auth_headers):
+    client.get("/api/history/", headers=auth_headers)
+
+    # The first heartbeat is stored, the ones right after it only kept in memory
+    response = client.post(
+        "/api/history/603/progress", json={"position": 10, "duration": 8000}, headers=auth_headers)
+    assert_db_usage(response, 1, 1)
+    for position in (20, 30):
+        response = client.post(
+            "/api/history/603/progress", json={"position": position}, headers=auth_headers)
+        assert response.json()["position"] == position
+        assert_db_usage(response, 0, 0)
+
+
+def test_assert_db_usage_reports_overruns():
+    response = SimpleNamespace(
+        headers={"X-DB-Connections": "2", "X-DB-Queries": "5"},
+        request=SimpleNamespace(url=SimpleNamespace(path="/api/watchlist/"))
+    )
+    assert_db_usage(response, 2, 5)
+    with pytest.raises(AssertionError, match="used 2 connections"):
+        assert_db_usage(response, 1, 5)
+    with pytest.raises(AssertionError, match="ran 5 queries"):
+        assert_db_usage(response, 2, 4)
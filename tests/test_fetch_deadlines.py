@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from app.deadline import Deadline, DeadlineExceeded, current_deadline
+from app.tmdb import fetch
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    calls = []
+
+    async def slow_fetch_upstream(key, request, priority):
+        calls.append(key)
+        deadline = current_deadline.get()
+        try:
+            await asyncio.wait_for(
+                asyncio.sleep(0.2), deadline.remaining() if deadline is not None else None)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded()
+        return b'{"id": 550}'
+
+    monkeypatch.setattr(fetch, "_fetch_upstream", slow_fetch_upstream)
+    return calls
+
+
+async def _fetch_within(budget: float, path: str) -> bytes:
+    current_deadline.set(Deadline(budget))
+    return await fetch.fetch_raw(path)
+
+
+def test_joined_request_is_only_bound_by_its_own_deadline(upstream):
+    async def run():
+        # The short request starts the upstream call, the long one joins it
+        short = asyncio.create_task(_fetch_within(0.05, "/test/deadlines/joined"))
+        await asyncio.sleep(0)
+        long = asyncio.create_task(_fetch_within(1, "/test/deadlines/joined"))
+        return await asyncio.gather(short, long, return_exceptions=True)
+
+    short, long = asyncio.run(run())
+    assert isinstance(short, DeadlineExceeded)
+    assert long == b'{"id": 550}'
+    assert upstream == [upstream[0]]
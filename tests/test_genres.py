@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+from app.tmdb.genres import GenreIndex, UnsupportedLanguage
+
+
+def test_unsupported_language_is_rejected(client):
+    for path in ("/api/genres/movie", "/api/genres/mapping"):
+        response = client.get(path, params={"language": "xx-XX"})
+        assert response.status_code == 400
+        assert "en-US" in response.json()["detail"]
+
+
+def test_supported_language_is_loaded_on_first_use(monkeypatch):
+    index = GenreIndex(["en-US", "fr-FR"])
+    loaded = []
+
+    async def load(language, priority):
+        loaded.append(language)
+
+    monkeypatch.setattr(index, "load", load)
+    asyncio.run(index.ensure_loaded("fr-FR"))
+    assert loaded == ["fr-FR"]
+    with pytest.raises(UnsupportedLanguage):
+        asyncio.run(index.ensure_loaded("de-DE"))
+    assert loaded == ["fr-FR"]
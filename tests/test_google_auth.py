@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import time
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+from jose.utils import calculate_at_hash
+
+from app.auth import google
+from app.auth.google import GoogleKeySet, InvalidIdToken, exchange_code, verify_id_token
+
+KID = "test-key"
+ACCESS_TOKEN = "test-access-token"
+
+
+def _private_pem() -> bytes:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    )
+
+
+def _public_jwk(private_pem: bytes, kid: str) -> dict:
+    public_pem = serialization.load_pem_private_key(private_pem, None).public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    return {**jwk.construct(public_pem, "RS256").to_dict(), "kid": kid, "use": "sig"}
+
+
+SIGNING_KEY = _private_pem()
+OTHER_KEY = _private_pem()
+
+
+class StandInGoogle:
+    """Google's token and JWKS endpoints, served through httpx.MockTransport"""
+
+    def __init__(self):
+        self.keys = [_public_jwk(SIGNING_KEY, KID)]
+        self.jwks_requests = 0
+        self.token_requests = []
+        self.id_token = None
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        if str(request.url) == google.GOOGLE_JWKS_URL:
+            self.jwks_requests += 1
+            return httpx.Response(
+                200, json={"keys": self.keys}, headers={"Cache-Control": "public, max-age=3600"})
+        if str(request.url) == google.GOOGLE_TOKEN_URL:
+            form = {key: values[0] for key, values in parse_qs(request.content.decode()).items()}
+            self.token_requests.append(form)
+            if form.get("code") != "good-code":
+                return httpx.Response(400, json={"error": "invalid_grant"})
+            return httpx.Response(200, json={"access_token": ACCESS_TOKEN, "id_token": self.id_token})
+        return httpx.Response(404)
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    server = StandInGoogle()
+    monkeypatch.setattr(google, "_client", httpx.AsyncClient(transport=httpx.MockTransport(server.handle)))
+    monkeypatch.setattr(google, "google_keys", GoogleKeySet(
+        url=google.GOOGLE_JWKS_URL, ttl=3600, min_refresh_interval=60))
+    return server
+
+
+def _id_token(key: bytes = SIGNING_KEY, kid: str = KID, **overrides) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": "https://accounts.google.com",
+        "aud": google.CLIENT_ID,
+        "sub": "1234567890",
+        "email": "viewer@example.com",
+        "email_verified": True,
+        "name": "Viewer",
+        "iat": now,
+        "exp": now + 3600,
+        "at_hash": calculate_at_hash(ACCESS_TOKEN, hashlib.sha256),
+        **overrides
+    }
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": kid})
+
+
+def _verify(id_token: str, access_token: str = ACCESS_TOKEN) -> dict:
+    return asyncio.run(verify_id_token(id_token, access_token))
+
+
+def test_exchange_code_posts_to_token_url(stand_in):
+    stand_in.id_token = _id_token()
+    tokens = asyncio.run(exchange_code("good-code"))
+    assert tokens["access_token"] == ACCESS_TOKEN
+    assert stand_in.token_requests[0]["grant_type"] == "authorization_code"
+    assert stand_in.token_requests[0]["client_id"] == google.CLIENT_ID
+
+
+def test_exchange_code_raises_on_rejected_code(stand_in):
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(exchange_code("bad-code"))
+
+
+def test_valid_id_token_is_verified(stand_in):
+    claims = _verify(_id_token())
+    assert claims["email"] == "viewer@example.com"
+    assert stand_in.jwks_requests == 1
+
+
+def test_signing_keys_are_cached(stand_in):
+    async def verify_twice():
+        await verify_id_token(_id_token(), ACCESS_TOKEN)
+        await verify_id_token(_id_token(), ACCESS_TOKEN)
+
+    asyncio.run(verify_twice())
+    assert stand_in.jwks_requests == 1
+
+
+@pytest.mark.parametrize("overrides", [
+    {"aud": "another-client"},
+    {"iss": "https://accounts.example.com"},
+    {"at_hash": calculate_at_hash("another-access-token", hashlib.sha256)},
+    {"email_verified": False},
+    {"exp": int(time.time()) - 60},
+])
+def test_invalid_claims_are_rejected(stand_in, overrides):
+    with pytest.raises(InvalidIdToken):
+        _verify(_id_token(**overrides))
+
+
+def test_token_signed_with_another_key_is_rejected(stand_in):
+    with pytest.raises(InvalidIdToken):
+        _verify(_id_token(key=OTHER_KEY))
+
+
+def test_unknown_key_id_refreshes_at_most_once_per_interval(stand_in):
+    async def verify_unknown_twice():
+        for _ in range(2):
+            with pytest.raises(InvalidIdToken):
+                await verify_id_token(_id_token(kid="rotated-key"), ACCESS_TOKEN)
+
+    asyncio.run(verify_unknown_twice())
+    assert stand_in.jwks_requests == 1
+
+
+def test_rotated_key_is_picked_up(stand_in):
+    async def verify_before_and_after_rotation():
+        await verify_id_token(_id_token(), ACCESS_TOKEN)
+        stand_in.keys.append(_public_jwk(OTHER_KEY, "rotated-key"))
+        google.google_keys.min_refresh_interval = 0
+        return await verify_id_token(_id_token(key=OTHER_KEY, kid="rotated-key"), ACCESS_TOKEN)
+
+    assert asyncio.run(verify_before_and_after_rotation())["sub"] == "1234567890"
+    assert stand_in.jwks_requests == 2
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app import database, history_buffer as buffer_module
+from app.history_buffer import HistoryBuffer
+from app.models import WatchHistory
+
+USER_ID = 9001
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    # A connection per session, so each test's event loop opens its own
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{database.engine.url.database}", poolclass=NullPool)
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+    monkeypatch.setattr(buffer_module, "AsyncSessionLocal", sessions)
+    yield sessions
+    asyncio.run(engine.dispose())
+
+
+def _buffer(max_entries: int = 100) -> HistoryBuffer:
+    return HistoryBuffer(enabled=True, flush_interval=60, max_rows=50,
+                         max_entries=max_entries, max_wait=0.1)
+
+
+async def _stored(sessions, content_id: str):
+    async with sessions() as db:
+        result = await db.execute(select(WatchHistory).where(
+            WatchHistory.user_id == USER_ID, WatchHistory.content_id == content_id))
+        return result.scalars().first()
+
+
+def test_writes_to_the_same_row_are_coalesced(sessions):
+    async def run():
+        buffer = _buffer()
+        await buffer.add({"user_id": USER_ID, "content_id": "c1", "position": 10})
+        await buffer.add({"user_id": USER_ID, "content_id": "c1", "completed": True})
+        assert buffer.get(USER_ID, "c1") == {
+            "user_id": USER_ID, "content_id": "c1", "position": 10, "completed": True}
+        assert buffer.stats()["pending"] == 1
+        assert buffer.stats()["coalesced"] == 1
+        assert await buffer.flush() == 1
+        return await _stored(sessions, "c1")
+
+    stored = asyncio.run(run())
+    assert (stored.position, stored.completed) == (10, True)
+
+
+def test_rows_being_flushed_stay_readable(sessions, monkeypatch):
+    write_history = buffer_module.write_history
+
+    async def run():
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def slow_write_history(db, rows, *args):
+            started.set()
+            await release.wait()
+            await write_history(db, rows, *args)
+
+        monkeypatch.setattr(buffer_module, "write_history", slow_write_history)
+        buffer = _buffer()
+        await buffer.add({"user_id": USER_ID, "content_id": "c2", "position": 10})
+        flush = asyncio.create_task(buffer.flush())
+        await started.wait()
+
+        # Written during the flush, read over the row being written
+        await buffer.add({"user_id": USER_ID, "content_id": "c2", "position": 20})
+        assert buffer.get(USER_ID, "c2")["position"] == 20
+        assert buffer.for_user(USER_ID)["c2"]["position"] == 20
+        release.set()
+        assert await flush == 1
+        assert buffer.get(USER_ID, "c2") == {
+            "user_id": USER_ID, "content_id": "c2", "position": 20}
+
+    asyncio.run(run())
+
+
+def test_rows_the_database_rejects_are_dropped(sessions):
+    async def run():
+        buffer = _buffer()
+        await buffer.add({"user_id": USER_ID, "content_id": "c3", "position": 10})
+        # content_id is part of the primary key, NULL is rejected
+        await buffer.add({"user_id": USER_ID, "content_id": None, "position": 10})
+        assert await buffer.flush() == 1
+        assert buffer.stats()["pending"] == 0
+        assert buffer.stats()["dropped_rows"] == 1
+        return await _stored(sessions, "c3")
+
+    assert asyncio.run(run()).position == 10
+
+
+def test_rows_are_kept_when_the_connection_is_lost(sessions, monkeypatch):
+    write_history = buffer_module.write_history
+
+    async def lost_connection(db, rows, *args):
+        raise DisconnectionError("connection lost")
+
+    async def run():
+        buffer = _buffer()
+        await buffer.add({"user_id": USER_ID, "content_id": "c4", "position": 10})
+        monkeypatch.setattr(buffer_module, "write_history", lost_connection)
+        assert await buffer.flush() == 0
+        assert buffer.stats()["pending"] == 1
+        assert buffer.stats()["failed_flushes"] == 1
+        assert buffer.get(USER_ID, "c4")["position"] == 10
+
+        monkeypatch.setattr(buffer_module, "write_history", write_history)
+        assert await buffer.flush() == 1
+        return await _stored(sessions, "c4")
+
+    assert asyncio.run(run()).position == 10
+
+
+def test_flusher_survives_a_failed_flush(sessions, monkeypatch):
+    async def broken_flush():
+        raise RuntimeError("rollback failed")
+
+    async def run():
+        buffer = _buffer()
+        buffer.flush_interval = 0.01
+        flushes = buffer.flush
+        monkeypatch.setattr(buffer, "flush", broken_flush)
+        buffer.start()
+        await asyncio.sleep(0.05)
+        assert not buffer._task.done()
+
+        monkeypatch.setattr(buffer, "flush", flushes)
+        await buffer.add({"user_id": USER_ID, "content_id": "c5", "position": 10})
+        await asyncio.sleep(0.05)
+        assert buffer.stats()["pending"] == 0
+        await buffer.stop()
+
+    asyncio.run(run())
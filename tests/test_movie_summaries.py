@@ -0,0 +1,41 @@
+import asyncio
+
+import orjson
+import pytest
+
+from app.tmdb import summary
+from app.tmdb.summary import MovieSummaryStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    requested = []
+
+    async def get_many(movie_ids):
+        movie_ids = list(movie_ids)
+        requested.append(movie_ids)
+        return {
+            movie_id: (orjson.dumps({"id": movie_id, "title": "Fight Club",
+                                     "release_date": "1999-10-15", "genres": []}), None)
+            for movie_id in movie_ids
+        }
+
+    monkeypatch.setattr(summary.movie_aggregates, "get_many", get_many)
+    store = MovieSummaryStore(max_bytes=1024 * 1024, ttl=60)
+    store.requested = requested
+    return store
+
+
+def test_content_ids_of_the_same_movie_all_get_a_summary(store):
+    summaries = asyncio.run(store.get_many(["550", "0550"]))
+    assert summaries["550"]["title"] == "Fight Club"
+    assert summaries["0550"] == summaries["550"]
+    # One upstream lookup for both spellings
+    assert store.requested == [[550]]
+
+
+def test_non_movie_content_ids_map_to_none(store):
+    summaries = asyncio.run(store.get_many(["tv-1399", "²", "550"]))
+    assert summaries["tv-1399"] is None
+    assert summaries["²"] is None
+    assert summaries["550"]["year"] == 1999
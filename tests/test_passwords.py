@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from passlib.hash import bcrypt
+
+from app.auth.passwords import OAUTH_ONLY_PASSWORD, PasswordHasher
+
+
+def test_empty_password_never_verifies():
+    hasher = PasswordHasher(workers=1, max_queue=0, rounds=4)
+    # Google users created before the sentinel store a hash of the empty password
+    legacy_hash = bcrypt.using(rounds=4).hash("")
+    assert asyncio.run(hasher.verify("", legacy_hash)) == (False, None)
+
+
+def test_oauth_only_users_have_no_password():
+    hasher = PasswordHasher(workers=1, max_queue=0, rounds=4)
+    assert asyncio.run(hasher.verify("anything", OAUTH_ONLY_PASSWORD)) == (False, None)
+    assert hasher.completed == 0
+
+
+def test_hashes_verify_in_the_worker_pool():
+    hasher = PasswordHasher(workers=1, max_queue=0, rounds=4)
+
+    async def hash_and_verify():
+        hashed = await hasher.hash("hunter2")
+        return await hasher.verify("hunter2", hashed), await hasher.verify("wrong", hashed)
+
+    try:
+        assert asyncio.run(hash_and_verify()) == ((True, None), (False, None))
+    finally:
+        hasher.shutdown()
+    assert (hasher.completed, hasher.failed) == (3, 0)
+
+
+def test_failed_jobs_are_not_counted_as_completed():
+    hasher = PasswordHasher(workers=1, max_queue=0, rounds=4)
+    try:
+        with pytest.raises(ValueError):
+            asyncio.run(hasher.verify("hunter2", "not-a-bcrypt-hash"))
+    finally:
+        hasher.shutdown()
+    assert (hasher.completed, hasher.failed) == (0, 1)
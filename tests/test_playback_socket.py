@@ -0,0 +1,74 @@
+import pytest
+from jose import jwt
+from starlette.websockets import WebSocketDisconnect
+
+from app.progress import progress_tracker
+
+
+def _user_id(auth_headers) -> int:
+    return int(jwt.get_unverified_claims(auth_headers["Authorization"].split()[1])["sub"])
+
+
+def _sync(ws):
+    # Messages are handled in order and only failures get a reply, so a reply
+    # to an invalid message means everything before it was handled
+    ws.send_json({"p": 10})
+    assert ws.receive_json()["error"] == "Invalid message"
+
+
+def test_header_token_authenticates(client, auth_headers):
+    with client.websocket_connect("/api/playback/ws", headers=auth_headers) as ws:
+        ws.send_json({"c": "600", "p": 120, "d": 6000})
+        _sync(ws)
+    assert progress_tracker.get(_user_id(auth_headers), "600")["position"] == 120
+
+
+def test_first_message_token_authenticates(client, auth_headers):
+    token = auth_headers["Authorization"].split()[1]
+    with client.websocket_connect("/api/playback/ws") as ws:
+        ws.send_json({"token": token})
+        ws.send_json({"c": "601", "p": 30, "d": 6000})
+        _sync(ws)
+    assert progress_tracker.get(_user_id(auth_headers), "601")["position"] == 30
+
+
+def test_bad_header_token_is_rejected_before_accept(client):
+    with pytest.raises(WebSocketDisconnect) as error:
+        with client.websocket_connect(
+                "/api/playback/ws", headers={"Authorization": "Bearer not-a-token"}):
+            pass
+    assert error.value.code == 1008
+
+
+def test_bad_first_message_token_is_rejected(client):
+    with client.websocket_connect("/api/playback/ws") as ws:
+        ws.send_json({"token": "not-a-token"})
+        with pytest.raises(WebSocketDisconnect) as error:
+            ws.receive_json()
+    assert error.value.code == 1008
+
+
+def test_binary_frames_close_the_socket(client, auth_headers):
+    with client.websocket_connect("/api/playback/ws", headers=auth_headers) as ws:
+        ws.send_bytes(b"\x00\x01")
+        with pytest.raises(WebSocketDisconnect) as error:
+            ws.receive_json()
+    assert error.value.code == 1003
+
+    with client.websocket_connect("/api/playback/ws") as ws:
+        ws.send_bytes(b"\x00\x01")
+        with pytest.raises(WebSocketDisconnect) as error:
+            ws.receive_json()
+    assert error.value.code == 1003
+
+
+def test_done_marks_the_title_completed(client, auth_headers):
+    with client.websocket_connect("/api/playback/ws", headers=auth_headers) as ws:
+        ws.send_json({"c": "602", "p": 600, "d": 6000})
+        ws.send_json({"c": "602", "done": True})
+        _sync(ws)
+    assert progress_tracker.get(_user_id(auth_headers), "602")["completed"] is True
+
+    response = client.get("/api/history/602", headers=auth_headers)
+    assert response.json()["completed"] is True
+    assert response.json()["position"] == 600
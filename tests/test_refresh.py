@@ -0,0 +1,28 @@
+import asyncio
+
+from app.tmdb import fetch, refresh
+from app.tmdb.cache import ResponseCache, UpstreamRequest
+
+
+def test_only_refreshes_that_start_are_counted(monkeypatch):
+    cache = ResponseCache(max_bytes=1024)
+    for key in ("/movie/550", "/movie/551"):
+        cache.set(key, b"{}", ttl=0, size=2, max_stale=60, request=UpstreamRequest(path=key))
+        cache.lookup(key)
+    refreshed = []
+
+    async def no_upstream(key, request):
+        refreshed.append(key)
+
+    monkeypatch.setattr(refresh, "response_cache", cache)
+    monkeypatch.setattr(fetch, "_refresh", no_upstream)
+    # A refresh of /movie/551 is already running
+    monkeypatch.setattr(fetch.tmdb_flights, "in_flight", lambda key: key == "/movie/551")
+
+    async def run():
+        started = refresh.refresh_hot_entries()
+        await asyncio.sleep(0)
+        return started
+
+    assert asyncio.run(run()) == 1
+    assert refreshed == ["/movie/550"]
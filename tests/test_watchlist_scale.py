@@ -0,0 +1,88 @@
+"""Watchlist add, re-add and delete for a user with thousands of items.
+
+Run with `pytest -s tests/test_watchlist_scale.py` to see the timings.
+"""
+import statistics
+import time
+from datetime import datetime
+
+from jose import jwt
+from sqlalchemy import func, select, text
+
+from app import database
+from app.models import Watchlist
+
+SEEDED_ITEMS = 5000
+ROUNDS = 20
+# Far above the single-index-lookup latency, well below a scan per request
+MAX_MEDIAN_MS = 50
+
+
+def _seed(user_id: int):
+    db = database.SessionLocal()
+    added_at = datetime.utcnow()
+    db.bulk_insert_mappings(Watchlist, [
+        {"user_id": user_id, "content_id": f"seed-{n}", "added_at": added_at}
+        for n in range(SEEDED_ITEMS)
+    ])
+    db.commit()
+    db.close()
+
+
+def _items(user_id: int) -> int:
+    db = database.SessionLocal()
+    try:
+        return db.scalar(select(func.count()).where(Watchlist.user_id == user_id))
+    finally:
+        db.close()
+
+
+def _timed(call):
+    start = time.perf_counter()
+    response = call()
+    return response, 1000 * (time.perf_counter() - start)
+
+
+def test_watchlist_writes_stay_fast_with_thousands_of_items(client, auth_headers):
+    user_id = int(jwt.get_unverified_claims(auth_headers["Authorization"].split()[1])["sub"])
+    _seed(user_id)
+    # Warm the principal cache so only the watchlist statements are timed
+    client.get("/api/watchlist/550", headers=auth_headers)
+
+    timings = {"add": [], "re-add": [], "delete": []}
+    for n in range(ROUNDS):
+        content_id = f"bench-{n}"
+        added, elapsed = _timed(lambda: client.post(
+            "/api/watchlist/", json={"content_id": content_id}, headers=auth_headers))
+        assert added.status_code == 200
+        timings["add"].append(elapsed)
+
+        again, elapsed = _timed(lambda: client.post(
+            "/api/watchlist/", json={"content_id": content_id}, headers=auth_headers))
+        # The existing item is returned unchanged, nothing is inserted
+        assert again.json() == added.json()
+        assert _items(user_id) == SEEDED_ITEMS + 1
+        timings["re-add"].append(elapsed)
+
+        deleted, elapsed = _timed(lambda: client.delete(
+            f"/api/watchlist/{content_id}/", headers=auth_headers))
+        assert deleted.status_code == 200
+        timings["delete"].append(elapsed)
+
+    assert _items(user_id) == SEEDED_ITEMS
+    for operation, samples in timings.items():
+        median = statistics.median(samples)
+        print(f"{operation}: median {median:.2f}ms, max {max(samples):.2f}ms "
+              f"with {SEEDED_ITEMS} items")
+        assert median < MAX_MEDIAN_MS
+
+
+def test_watchlist_lookups_use_the_unique_index():
+    db = database.SessionLocal()
+    try:
+        plan = db.execute(text(
+            "EXPLAIN QUERY PLAN DELETE FROM watchlist "
+            "WHERE user_id = 1 AND content_id = '550'")).all()
+    finally:
+        db.close()
+    assert "uq_watchlist_user_content" in " ".join(row[-1] for row in plan)